@@ -1,17 +1,164 @@
 from flask import Flask
 from auth.routes import auth_bp
 from main.routes import main_bp
+from utils.storage import (
+    configure as configure_storage, import_json_to_sqlite, shard_notes, get_all_users, BASE_DIR,
+    compact_storage, preload as preload_storage
+)
+from utils.hashing import configure as configure_hashing, HashPoolBusy
+from utils import asgi, avatars, fragment_cache, jobs, metrics, ratelimit, revisions, sessions, tasks, warmup
+from utils.ratelimit import RateLimited
 import os
+import time
 
 def create_app():
+    started = time.perf_counter()
     app = Flask(__name__, static_folder="static", template_folder="templates")
     # IMPORTANT: set a strong secret key in production (env var)
     app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret-key-change-me")
 
+    # sessions live server-side; the cookie only carries an opaque id
+    # ("sqlite" shares data/sessions.db between workers, "memory" is per process, "cookie" = Flask default)
+    app.config["SESSION_BACKEND"] = os.environ.get("SESSION_BACKEND", "sqlite")
+    app.config["SESSION_SQLITE_PATH"] = os.environ.get("SESSION_SQLITE_PATH")
+    app.config["SESSION_TTL"] = int(os.environ.get("SESSION_TTL", sessions.SESSION_TTL))
+    app.config["SESSION_REAP_INTERVAL"] = int(os.environ.get("SESSION_REAP_INTERVAL", sessions.REAP_INTERVAL))
+    sessions.init_app(app, BASE_DIR)
+
+    # login/register/OTP throttling by IP and username, shared via data/ratelimit.db
+    # ("memory" keeps per-process counters); override a limit with e.g. RATE_LIMIT_LOGIN_IP=30/60
+    app.config["RATE_LIMIT_BACKEND"] = os.environ.get("RATE_LIMIT_BACKEND", "sqlite")
+    app.config["RATE_LIMIT_SQLITE_PATH"] = os.environ.get("RATE_LIMIT_SQLITE_PATH")
+    for name in ratelimit.DEFAULT_LIMITS:
+        key = f"RATE_LIMIT_{name.upper()}"
+        app.config[key] = os.environ.get(key)
+    ratelimit.configure(app.config, BASE_DIR)
+
+    # storage backend: "json" (data/*.json) or "sqlite" (data/notepad.db)
+    app.config["STORAGE_BACKEND"] = os.environ.get("STORAGE_BACKEND", "json")
+    app.config["SQLITE_PATH"] = os.environ.get("SQLITE_PATH")
+    # json mode: "snapshot" rewrites data/*.json per change, "journal" appends to a log
+    app.config["STORAGE_MODE"] = os.environ.get("STORAGE_MODE", "snapshot")
+    app.config["JOURNAL_COMPACT_THRESHOLD"] = int(os.environ.get("JOURNAL_COMPACT_THRESHOLD", 500))
+    # json layout: "single" data/notes.json, or "sharded" one file per owner under data/notes/
+    # (split from notes.json automatically on first start, or with `flask shard-notes`)
+    app.config["STORAGE_LAYOUT"] = os.environ.get("STORAGE_LAYOUT", "single")
+    # json encoding on write: "compact" (default), "pretty" (indent=2), "gzip" or "zstd"
+    # (needs zstandard); files in any of these are read, so switching needs no migration
+    app.config["STORAGE_FORMAT"] = os.environ.get("STORAGE_FORMAT", "compact")
+    app.config["STORAGE_FORMAT_LEVEL"] = os.environ.get("STORAGE_FORMAT_LEVEL")
+    # opt-in instrumentation: /metrics, Server-Timing headers, sampled cProfile dumps
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "0") == "1"
+    app.config["METRICS_SERVER_TIMING"] = os.environ.get("METRICS_SERVER_TIMING", "0") == "1"
+    app.config["METRICS_PROFILE_SAMPLE"] = float(os.environ.get("METRICS_PROFILE_SAMPLE", 0))
+    app.config["METRICS_SLOW_MS"] = float(os.environ.get("METRICS_SLOW_MS", 500))
+    app.config["METRICS_PROFILE_DIR"] = os.environ.get("METRICS_PROFILE_DIR")
+    configure_storage(app.config)
+
+    # password hashing runs in a bounded process pool; 0 workers = inline
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+    app.config["PASSWORD_HASH_QUEUE"] = int(os.environ.get("PASSWORD_HASH_QUEUE", app.config["PASSWORD_HASH_WORKERS"] * 4))
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    configure_hashing(app.config)
+
+    # profile pictures: content-addressed under static/uploads/avatars
+    app.config["AVATAR_DIR"] = os.environ.get("AVATAR_DIR")
+    app.config["AVATAR_MAX_BYTES"] = int(os.environ.get("AVATAR_MAX_BYTES", avatars.MAX_AVATAR_BYTES))
+    app.config["AVATAR_THUMB_SIZE"] = int(os.environ.get("AVATAR_THUMB_SIZE", avatars.THUMB_SIZE))
+    avatars.configure(app.config)
+
+    # rendered note-card fragments, LRU within a byte budget
+    app.config["FRAGMENT_CACHE_BYTES"] = int(os.environ.get("FRAGMENT_CACHE_BYTES", fragment_cache.FRAGMENT_CACHE_BYTES))
+    fragment_cache.configure(app.config)
+
+    # note history: retention enforced by a periodic job (interval 0 = never)
+    app.config["REVISION_RETENTION_DAYS"] = int(os.environ.get("REVISION_RETENTION_DAYS", revisions.RETENTION_DAYS))
+    app.config["REVISION_MAX_COUNT"] = int(os.environ.get("REVISION_MAX_COUNT", revisions.MAX_REVISIONS))
+    app.config["REVISION_PRUNE_INTERVAL"] = int(os.environ.get("REVISION_PRUNE_INTERVAL", revisions.PRUNE_INTERVAL))
+
+    # deferred work (thumbnails, cleanup) queued in data/jobs.db and run by worker threads;
+    # 0 workers = run queued jobs inline and periodic ones only via `flask run-jobs`
+    app.config["JOB_BACKEND"] = os.environ.get("JOB_BACKEND", "sqlite")
+    app.config["JOB_SQLITE_PATH"] = os.environ.get("JOB_SQLITE_PATH")
+    app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", jobs.JOB_WORKERS))
+    app.config["JOB_POLL_INTERVAL"] = float(os.environ.get("JOB_POLL_INTERVAL", jobs.POLL_INTERVAL))
+    # periodic jobs (intervals in seconds, 0 = off); archived notes are purged after
+    # PURGE_ARCHIVED_DAYS days, never by default
+    app.config["PURGE_ARCHIVED_DAYS"] = int(os.environ.get("PURGE_ARCHIVED_DAYS", tasks.PURGE_ARCHIVED_DAYS))
+    app.config["PURGE_INTERVAL"] = int(os.environ.get("PURGE_INTERVAL", tasks.PURGE_INTERVAL))
+    app.config["AVATAR_GC_INTERVAL"] = int(os.environ.get("AVATAR_GC_INTERVAL", tasks.AVATAR_GC_INTERVAL))
+    app.config["COMPACT_INTERVAL"] = int(os.environ.get("COMPACT_INTERVAL", tasks.COMPACT_INTERVAL))
+    jobs.configure(app.config, BASE_DIR)
+    tasks.schedule(jobs.queue, app.config)
+    app.before_request(jobs.queue.ensure_running)
+
+    # asgi.py serving: handler thread pool size and how many requests may wait for it
+    app.config["ASGI_THREADS"] = int(os.environ.get("ASGI_THREADS", asgi.ASGI_THREADS))
+    app.config["ASGI_BACKLOG"] = int(os.environ.get("ASGI_BACKLOG", asgi.ASGI_BACKLOG))
+
+    # startup: compiled templates shared by workers through a bytecode cache ("" = off);
+    # WARM_START loads templates and data in create_app() instead of the first request
+    app.config["TEMPLATE_CACHE_DIR"] = os.environ.get("TEMPLATE_CACHE_DIR", os.path.join(BASE_DIR, "template_cache"))
+    app.config["WARM_START"] = os.environ.get("WARM_START", "1") == "1"
+
+    @app.errorhandler(HashPoolBusy)
+    def hash_pool_busy(e):
+        return "Server is busy, please try again shortly.", 503, {"Retry-After": str(e.retry_after)}
+
+    @app.errorhandler(RateLimited)
+    def rate_limited(e):
+        return "Too many attempts, please try again later.", 429, {"Retry-After": str(e.retry_after)}
+
+    @app.cli.command("import-json")
+    def import_json():
+        """Copy data/users.json and data/notes.json into the SQLite database."""
+        users, notes = import_json_to_sqlite(app.config["SQLITE_PATH"])
+        print(f"Imported {users} users and {notes} notes.")
+
+    @app.cli.command("shard-notes")
+    def shard_notes_command():
+        """Split data/notes.json into per-owner files under data/notes/."""
+        moved = shard_notes()
+        print(f"Moved {moved} notes into data/notes/." if moved else "data/notes/ is already sharded.")
+
+    @app.cli.command("gc-avatars")
+    def gc_avatars():
+        """Delete stored profile pictures no user references anymore."""
+        removed = avatars.avatar_store.collect_garbage(u.get("profile_pic") for u in get_all_users())
+        print(f"Removed {removed} unreferenced avatar file(s).")
+
+    @app.cli.command("prune-revisions")
+    def prune_revisions():
+        """Apply the note history retention policy now."""
+        removed = revisions.prune_all(app.config["REVISION_RETENTION_DAYS"], app.config["REVISION_MAX_COUNT"])
+        print(f"Removed {removed} old revision(s).")
+
+    @app.cli.command("run-jobs")
+    def run_jobs():
+        """Queue periodic jobs that are due, then run every due job (e.g. from cron)."""
+        queued = jobs.queue.enqueue_due()
+        ran = jobs.queue.run_pending()
+        print(f"Queued {queued} periodic job(s); ran {ran} job(s). Queue: {jobs.queue.store.counts() or 'empty'}.")
+
+    @app.cli.command("warm-cache")
+    def warm_cache():
+        """Fill the template bytecode cache and the notes index cache (e.g. at deploy)."""
+        compiled = warmup.precompile_templates(app)
+        preload_storage()
+        compact_storage()  # also writes the notes index cache
+        print(f"Compiled {compiled} templates into {app.config['TEMPLATE_CACHE_DIR'] or '(no cache dir)'}; "
+              f"data loaded and index cache written.")
+
+    if app.config["METRICS_ENABLED"]:
+        metrics.init_app(app)
+
     # register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
 
+    # last, so every template loader is in place
+    warmup.init_app(app, started)
+
     return app
 
 if __name__ == "__main__":
@@ -0,0 +1,12 @@
+"""Production entry point for ASGI servers.
+
+    uvicorn asgi:app --workers 4
+    hypercorn asgi:app --workers 4
+
+Handlers run in a bounded thread pool (ASGI_THREADS, ASGI_BACKLOG), and on
+shutdown pending writes are flushed. ``python app.py`` stays the dev server.
+"""
+from app import create_app
+from utils.asgi import create_asgi_app
+
+app = create_asgi_app(create_app())
@@ -2,8 +2,11 @@ from flask import (
     Blueprint, render_template, request, redirect, url_for, flash, session, current_app
 )
 from utils.storage import (
-    find_user_by_username, add_user, hash_password, verify_password, update_user
+    find_user, find_user_by_username, add_user, hash_password, verify_password, update_user,
+    upgrade_password_hash, DuplicateUserError
 )
+from utils.sessions import revoke_user_sessions
+from utils import ratelimit
 from datetime import datetime, timedelta
 import random
 
@@ -20,6 +23,7 @@ def calculate_age(dob_str):
 @auth_bp.route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
+        ratelimit.limiter.hit("register_ip", request.remote_addr)
         data = request.form
         username = data.get("username").strip()
         email = data.get("email").strip()
@@ -45,6 +49,8 @@ def register():
         if password != confirm:
             flash("Passwords do not match.", "danger")
             return render_template("register.html", form=data)
+        # cheap hash lookup so a taken name doesn't cost a password hash;
+        # add_user() still enforces uniqueness for concurrent registrations
         if find_user_by_username(username):
             flash("Username already exists. Choose another.", "danger")
             return render_template("register.html", form=data)
@@ -63,7 +69,11 @@ def register():
             "address": address,
             "created_at": datetime.utcnow().isoformat()
         }
-        add_user(user)
+        try:
+            add_user(user)
+        except DuplicateUserError:
+            flash("Username already exists. Choose another.", "danger")
+            return render_template("register.html", form=data)
         flash("Registration successful. Please log in.", "success")
         return redirect(url_for("auth.login"))
     return render_template("register.html")
@@ -75,22 +85,24 @@ def login():
     if request.method == "POST":
         identifier = request.form.get("username", "").strip()
         password = request.form.get("password") or ""
+        # throttled per address and per account before any password hash, so
+        # a credential-stuffing burst is rejected without touching the CPU
+        ratelimit.limiter.hit("login_ip", request.remote_addr)
 
-        # Try to find user by username
-        user = find_user_by_username(identifier)
-
-        # If not found, try finding by email
-        if not user:
-            from utils.storage import find_user_by_email
-            user = find_user_by_email(identifier)
+        # Username first, then email (index lookups, no hashing)
+        user = find_user(identifier)
+        # keyed on the account, so its username and email share one budget
+        subject = (user["username"] if user else identifier).casefold()
+        ratelimit.limiter.check("login_user", subject)
 
         if not user or not verify_password(user["password_hash"], password):
-            attempts = session.get("login_attempts", 0) + 1
-            session["login_attempts"] = attempts
+            ratelimit.limiter.record("login_user", subject)
             flash("Invalid username/email or password.", "danger")
             return render_template("login.html")
 
         # Success
+        ratelimit.limiter.reset("login_user", subject)
+        upgrade_password_hash(user["username"], user["password_hash"], password)
         session.clear()
         session["user"] = user["username"]
         flash("Logged in.", "success")
@@ -107,6 +119,16 @@ def logout():
     return redirect(url_for("auth.login"))
 
 
+@auth_bp.route("/logout-all", methods=["POST"])
+def logout_all():
+    username = session.get("user")
+    if username:
+        revoke_user_sessions(current_app, username)
+    session.clear()
+    flash("Logged out on all devices.", "info")
+    return redirect(url_for("auth.login"))
+
+
 # ===================== FORGOT PASSWORD (ONE PAGE OTP) =====================
 @auth_bp.route("/forgot-password", methods=["GET", "POST"])
 def forgot_password():
@@ -119,6 +141,8 @@ def forgot_password():
     # Step 1: Request OTP
     if action == "request_otp":
         username = request.form.get("username", "").strip()
+        ratelimit.limiter.hit("otp_request_ip", request.remote_addr)
+        ratelimit.limiter.hit("otp_request_user", username.casefold())
         user = find_user_by_username(username)
         if not user:
             flash("Username not found.", "danger")
@@ -143,6 +167,7 @@ def forgot_password():
     elif action == "verify_otp":
         otp_stage = True
         otp = request.form.get("otp", "").strip()
+        ratelimit.limiter.hit("otp_verify", request.remote_addr)
 
         if "otp_value" not in session:
             flash("No OTP found. Please request a new one.", "danger")
@@ -187,6 +212,8 @@ def reset_password():
 
         username = session.get("otp_for")
         success = update_user(username, {"password_hash": hash_password(pwd)})
+        # a password reset ends every session the account had open
+        revoke_user_sessions(current_app, username)
 
         # Clear OTP-related session data
         session.pop("otp_for", None)
@@ -0,0 +1,99 @@
+"""Worker boot time and first-request latency, cold vs. warm start.
+
+Generates synthetic data (see synth_data.py) in a scratch directory and
+starts --runs fresh Python processes per scenario. Each one imports the
+app, runs create_app() and serves one logged-in GET /home through the test
+client, timing each step:
+
+  lazy         WARM_START=0, no template cache: templates compile and the
+               data is parsed inside the first request (the old behaviour)
+  warm-cold    WARM_START=1 with empty caches: the same work moves into
+               create_app(), and the caches get filled at exit
+  warm         WARM_START=1 after `flask warm-cache`: templates come from
+               the bytecode cache and notes from the pickled index cache
+
+    python benchmarks/boot_bench.py
+    python benchmarks/boot_bench.py --users 200 --notes-per-user 250 --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+booted = time.perf_counter()
+client = app.test_client()
+with client.session_transaction() as s:
+    s["user"] = "bench0"
+response = client.get("/home")
+assert response.status_code == 200, response.status_code
+done = time.perf_counter()
+print(json.dumps({"import": imported - started, "create_app": booted - imported, "first_request": done - booted}))
+"""
+
+
+def run_child(env):
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def clear_caches(data_dir, template_dir):
+    shutil.rmtree(template_dir, ignore_errors=True)
+    for name in os.listdir(data_dir):
+        if name.endswith(".index.pickle"):
+            os.remove(os.path.join(data_dir, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--notes-per-user", type=int, default=200)
+    parser.add_argument("--content-size", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from synth_data import generate
+
+    data_dir = tempfile.mkdtemp()
+    template_dir = os.path.join(data_dir, "template_cache")
+    try:
+        generate(data_dir, args.users, args.notes_per_user, args.content_size, password_hash="bench")
+        base = dict(os.environ, NOTEPAD_DATA_DIR=data_dir, TEMPLATE_CACHE_DIR=template_dir,
+                    PASSWORD_HASH_WORKERS="0", JOB_WORKERS="0", SESSION_BACKEND="memory",
+                    RATE_LIMIT_BACKEND="memory")
+        scenarios = {
+            "lazy": dict(base, WARM_START="0", TEMPLATE_CACHE_DIR=""),
+            "warm-cold": dict(base, WARM_START="1"),
+            "warm": dict(base, WARM_START="1"),
+        }
+        print(f"{args.users * args.notes_per_user} notes, median of {args.runs} runs")
+        print(f"{'scenario':>10} {'import ms':>10} {'create_app ms':>14} {'first req ms':>13} {'total ms':>9}")
+        for name, env in scenarios.items():
+            samples = []
+            for _ in range(args.runs):
+                if name != "warm":
+                    clear_caches(data_dir, template_dir)
+                samples.append(run_child(env))
+            median = {k: statistics.median(s[k] for s in samples) * 1000 for k in samples[0]}
+            total = sum(median.values())
+            print(f"{name:>10} {median['import']:>10.1f} {median['create_app']:>14.1f} "
+                  f"{median['first_request']:>13.1f} {total:>9.1f}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Dump / parse throughput of the data-file codecs on synthetic notes.
+
+Builds a notes.json-sized document with synth_data, then for each JSON
+library available (stdlib json, orjson) and each STORAGE_FORMAT times
+Codec.encode() and Codec.decode() and reports MB/s against the
+uncompressed JSON size, plus the bytes that would land on disk.
+
+    python benchmarks/codec_bench.py
+    python benchmarks/codec_bench.py --notes 10000 100000 --content-size 2000 --repeat 5
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synth_data import generate  # noqa: E402
+from utils import codec  # noqa: E402
+
+
+def make_document(notes, content_size):
+    data_dir = tempfile.mkdtemp()
+    try:
+        users = max(1, notes // 100)
+        generate(data_dir, users=users, notes_per_user=notes // users, content_size=content_size,
+                 password_hash="bench")
+        with open(os.path.join(data_dir, "notes.json"), "rb") as f:
+            return codec.Codec().decode(f.read())
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def libraries():
+    found = [("json", None)]
+    if codec.orjson is not None:
+        found.append(("orjson", codec.orjson))
+    return found
+
+
+def formats():
+    for name in codec.FORMATS:
+        if name == "zstd" and codec.zstandard is None:
+            continue
+        yield name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--content-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    installed = codec.orjson
+    print(f"{'notes':>7} {'library':>7} {'format':>8} {'dump MB/s':>10} {'parse MB/s':>11} {'on disk MB':>11}")
+    try:
+        for count in args.notes:
+            document = make_document(count, args.content_size)
+            for library, module in libraries():
+                codec.orjson = module
+                plain = len(codec.dumps(document))
+                for name in formats():
+                    c = codec.Codec(name)
+                    encoded = c.encode(document)
+                    dump = min(timeit.repeat(lambda: c.encode(document), number=1, repeat=args.repeat))
+                    parse = min(timeit.repeat(lambda: c.decode(encoded), number=1, repeat=args.repeat))
+                    print(f"{count:>7} {library:>7} {name:>8} {plain / dump / 1e6:>10.1f} "
+                          f"{plain / parse / 1e6:>11.1f} {len(encoded) / 1e6:>11.2f}")
+    finally:
+        codec.orjson = installed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Bulk import: one add_note() per note vs. batched import_notes().
+
+Each run uses a scratch data directory. "one-by-one" is what a migration
+script looping over add_note() does: in snapshot mode every insert rewrites
+notes.json, so the total cost grows quadratically. "batched" is
+utils.notes_io.import_notes(), which commits IMPORT_BATCH_SIZE notes per
+storage write.
+
+    python benchmarks/import_bench.py
+    python benchmarks/import_bench.py --sizes 1000 10000 --skip-slow-above 2000
+"""
+import argparse
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def records(count):
+    for i in range(count):
+        yield f"line {i + 1}", {"title": f"Imported {i}", "content": "lorem ipsum " * 20,
+                                "created_at": "2024-01-01T00:00:00"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 10000])
+    parser.add_argument("--skip-slow-above", type=int, default=2000,
+                        help="don't run one-by-one for sizes above this")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    # registered first so it runs last, after the stores' own atexit hooks
+    atexit.register(shutil.rmtree, data_dir, ignore_errors=True)
+    os.environ["NOTEPAD_DATA_DIR"] = data_dir
+    sys.path.insert(0, ROOT)
+    from utils import storage
+    from utils.notes_io import import_notes
+
+    def fresh():
+        for name in os.listdir(data_dir):
+            os.remove(os.path.join(data_dir, name))
+        storage.configure({"STORAGE_BACKEND": "json"})
+
+    print(f"{'notes':>8} {'one-by-one s':>13} {'batched s':>10}")
+    for size in args.sizes:
+        slow = ""
+        if size <= args.skip_slow_above:
+            fresh()
+            started = time.perf_counter()
+            for _, record in records(size):
+                storage.add_note(dict(record, id=None, owner="bench", status="active", updated_at=None))
+            slow = f"{time.perf_counter() - started:.2f}"
+        fresh()
+        started = time.perf_counter()
+        imported, _, _ = import_notes("bench", records(size))
+        fast = time.perf_counter() - started
+        assert imported == size == len(storage.get_notes_by_owner("bench"))
+        print(f"{size:>8} {slow or '-':>13} {fast:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
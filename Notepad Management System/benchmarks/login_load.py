@@ -0,0 +1,95 @@
+"""Concurrent-login load test.
+
+Starts the app on a threaded local server over a scratch data directory,
+then fires --concurrency client threads doing POST /auth/login until
+--requests logins have completed. Reports p50/p95/p99 latency and how many
+requests were shed with 503 (hash queue full).
+
+    python benchmarks/login_load.py --hash-workers 0      # inline hashing
+    python benchmarks/login_load.py --hash-workers 4 --hash-queue 16
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--hash-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--hash-queue", type=int, default=None)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    os.environ["NOTEPAD_DATA_DIR"] = data_dir
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.hash_workers)
+    if args.hash_queue is not None:
+        os.environ["PASSWORD_HASH_QUEUE"] = str(args.hash_queue)
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server
+    from app import create_app
+    from utils import hashing, storage
+
+    app = create_app()
+    password_hash = hashing.hash_pool.hash("password")
+    for i in range(args.users):
+        storage.add_user({"username": f"user{i}", "email": f"user{i}@example.com", "password_hash": password_hash})
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/auth/login"
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *a, **kw):
+            return None
+
+    opener = urllib.request.build_opener(NoRedirect)
+
+    def login(i):
+        body = urllib.parse.urlencode({"username": f"user{i % args.users}", "password": "password"}).encode()
+        started = time.perf_counter()
+        try:
+            status = opener.open(url, data=body).status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        return status, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(login, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    ok = [ms for status, ms in results if status in (200, 302)]
+    shed = sum(1 for status, _ in results if status == 503)
+    print(f"hash_workers={args.hash_workers} concurrency={args.concurrency} requests={args.requests}")
+    print(f"throughput={len(results) / elapsed:.1f} req/s ok={len(ok)} shed_503={shed}")
+    print(f"login latency ms: p50={percentile(ok, 50):.1f} p95={percentile(ok, 95):.1f} p99={percentile(ok, 99):.1f}")
+    print("hash pool:", hashing.hash_pool.stats())
+    hashing.hash_pool.shutdown()
+    shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""Route benchmark: every blueprint flow, in-process and over real HTTP.
+
+Generates synthetic data (see synth_data.py) in a scratch directory, then
+runs the same client scenario in up to three modes:
+
+  test_client  sequential clients through Flask's test client (app cost only)
+  server       concurrent clients over HTTP against a pre-forked server with
+               --workers processes sharing one listening socket
+  asgi         the same, but each worker is uvicorn serving asgi.py (needs
+               uvicorn installed); compare its req/s with "server"
+
+Each client registers a fresh account, then logs in as one of the
+synthetic users. It then runs --iterations rounds of: /home with every
+sort_by, create, edit, archive, /archive, restore, /profile, /search, and
+every fifth round a delete.
+
+The report gives per-flow count, errors, p50/p95/p99 and mean latency,
+throughput, and peak RSS (the client process and each server worker).
+Results are written as JSON to --out (default benchmarks/results/). With
+--compare they are diffed against an earlier result file.
+
+    python benchmarks/route_bench.py
+    python benchmarks/route_bench.py --users 50 --notes-per-user 1000 --clients 8 --workers 4
+    python benchmarks/route_bench.py --backend sqlite --compare benchmarks/results/<earlier>.json
+    python benchmarks/route_bench.py --modes server asgi --workers 4 --clients 16
+"""
+import argparse
+import atexit
+import http.cookiejar
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SORTS = ("date_desc", "date_asc", "title_asc", "title_desc", "updated_desc")
+SEARCH_TERMS = ("meeting", "budget", "rec", "garden book", "zzz")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+# ---------- drivers ----------
+class TestClientDriver:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post(self, path, data=None):
+        return self.client.post(path, data=data or {}).status_code
+
+
+class HttpDriver:
+    """urllib client with its own cookie jar; redirects are not followed."""
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *a, **kw):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), self._NoRedirect)
+
+    def _open(self, path, body=None):
+        try:
+            with self.opener.open(self.base_url + path, data=body) as r:
+                r.read()
+                return r.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def get(self, path):
+        return self._open(path)
+
+    def post(self, path, data=None):
+        return self._open(path, urllib.parse.urlencode(data or {}).encode())
+
+
+# ---------- scenario ----------
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def timed(self, name, call, *args):
+        started = time.perf_counter()
+        status = call(*args)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.samples.setdefault(name, []).append(elapsed_ms)
+            if status >= 400:
+                self.errors[name] = self.errors.get(name, 0) + 1
+        return status
+
+
+def run_client(driver, recorder, client_no, username, note_ids, iterations, password):
+    rng = random.Random(client_no)
+    tag = f"{os.getpid()}-{client_no}-{time.time_ns()}"
+    recorder.timed("register", driver.post, "/auth/register", {
+        "username": f"new{tag}", "email": f"new{tag}@example.com", "password": password,
+        "confirm_password": password, "first_name": "New", "last_name": "User",
+        "dob": "1990-01-01", "contact": "0000000000",
+    })
+    recorder.timed("login", driver.post, "/auth/login", {"username": username, "password": password})
+    pool = list(note_ids)
+    for i in range(iterations):
+        for sort_by in SORTS:
+            recorder.timed(f"home:{sort_by}", driver.get, f"/home?sort_by={sort_by}")
+        recorder.timed("create", driver.post, "/note/new",
+                       {"title": f"bench {tag} {i}", "content": "created by route_bench " * 10})
+        note_id = pool[i % len(pool)]
+        recorder.timed("edit", driver.post, f"/note/{note_id}/edit",
+                       {"title": f"edited {i}", "content": "edited by route_bench " * 10})
+        recorder.timed("archive", driver.post, f"/note/{note_id}/archive")
+        recorder.timed("archive_view", driver.get, "/archive")
+        recorder.timed("restore", driver.post, f"/note/{note_id}/restore")
+        recorder.timed("profile", driver.get, "/profile")
+        recorder.timed("search", driver.get, "/search?q=" + urllib.parse.quote(rng.choice(SEARCH_TERMS)))
+        if i % 5 == 4 and len(pool) > 1:
+            victim = pool.pop()
+            driver.post(f"/note/{victim}/archive")
+            recorder.timed("delete", driver.post, f"/note/{victim}/delete")
+
+
+def summarize(recorder, seconds):
+    ops = {}
+    total = 0
+    for name, samples in sorted(recorder.samples.items()):
+        total += len(samples)
+        ops[name] = {
+            "count": len(samples),
+            "errors": recorder.errors.get(name, 0),
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3),
+            "mean_ms": round(sum(samples) / len(samples), 3),
+        }
+    return {"ops": ops, "requests": total, "seconds": round(seconds, 3),
+            "throughput_rps": round(total / seconds, 2) if seconds else 0.0}
+
+
+# ---------- setup ----------
+def prepare_data(data_dir, args, password_hash):
+    from synth_data import generate
+
+    for name in os.listdir(data_dir):
+        path = os.path.join(data_dir, name)
+        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+    info = generate(data_dir, args.users, args.notes_per_user, args.content_size, args.seed, password_hash)
+    if args.backend == "sqlite":
+        from utils import storage
+        storage.import_json_to_sqlite(os.path.join(data_dir, "notepad.db"))
+    return info
+
+
+def peak_rss_kb(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if pid == "self":
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return None
+
+
+def run_test_client(args, info, password):
+    from app import create_app
+
+    app = create_app()
+    recorder = Recorder()
+    started = time.perf_counter()
+    for n in range(args.clients):
+        username = info["users"][n % len(info["users"])]
+        run_client(TestClientDriver(app), recorder, n, username, info["notes"][username],
+                   args.iterations, password)
+    result = summarize(recorder, time.perf_counter() - started)
+    result["peak_rss_kb"] = peak_rss_kb()
+    return result
+
+
+def _serve(fd, port):
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    make_server("127.0.0.1", port, create_app(), threaded=True, fd=fd).serve_forever()
+
+
+def _serve_asgi(fd, port):
+    import uvicorn
+    from asgi import app
+
+    config = uvicorn.Config(app, log_level="error", lifespan="on")
+    uvicorn.Server(config).run(sockets=[socket.socket(fileno=os.dup(fd))])
+
+
+def run_server(args, info, password, serve=_serve):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(128)
+    port = sock.getsockname()[1]
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=serve, args=(sock.fileno(), port), daemon=True) for _ in range(args.workers)]
+    for w in workers:
+        w.start()
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):  # wait until a worker answers
+        try:
+            urllib.request.urlopen(base_url + "/auth/login").read()
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        futures = []
+        for n in range(args.clients):
+            username = info["users"][n % len(info["users"])]
+            futures.append(pool.submit(run_client, HttpDriver(base_url), recorder, n, username,
+                                       info["notes"][username], args.iterations, password))
+        for f in futures:
+            f.result()
+    result = summarize(recorder, time.perf_counter() - started)
+    result["workers"] = args.workers
+    result["worker_peak_rss_kb"] = [peak_rss_kb(w.pid) for w in workers]
+    result["client_peak_rss_kb"] = peak_rss_kb()
+    for w in workers:
+        w.terminate()
+        w.join()
+    sock.close()
+    return result
+
+
+# ---------- reporting ----------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results):
+    for mode, result in results["modes"].items():
+        print(f"\n== {mode}: {result['requests']} requests in {result['seconds']}s "
+              f"({result['throughput_rps']} req/s)")
+        print(f"{'flow':<20} {'count':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, op in result["ops"].items():
+            print(f"{name:<20} {op['count']:>6} {op['errors']:>4} {op['p50_ms']:>9.2f} "
+                  f"{op['p95_ms']:>9.2f} {op['p99_ms']:>9.2f}")
+        rss = {k: v for k, v in result.items() if "rss" in k}
+        print("peak RSS (KB):", rss)
+
+
+def print_comparison(results, baseline_path, threshold=0.2):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n== compared with {baseline_path} (commit {baseline['meta'].get('commit')})")
+    for mode, result in results["modes"].items():
+        old_ops = baseline["modes"].get(mode, {}).get("ops", {})
+        for name, op in result["ops"].items():
+            old = old_ops.get(name)
+            if not old or not old["p95_ms"]:
+                continue
+            change = (op["p95_ms"] - old["p95_ms"]) / old["p95_ms"]
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"{mode:<12} {name:<20} p95 {old['p95_ms']:>9.2f} -> {op['p95_ms']:>9.2f} ({change:+.0%}){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--notes-per-user", type=int, default=200)
+    parser.add_argument("--content-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--modes", nargs="+", choices=["test_client", "server", "asgi"],
+                        default=["test_client", "server"])
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--mode", choices=["snapshot", "journal"], default="snapshot")
+    parser.add_argument("--layout", choices=["single", "sharded"], default="single")
+    parser.add_argument("--hash-workers", type=int, default=0, help="PASSWORD_HASH_WORKERS for the app")
+    parser.add_argument("--out", help="result file (default: benchmarks/results/route_bench-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to diff p95 against")
+    args = parser.parse_args()
+    args.clients = min(args.clients, args.users)  # one synthetic account per client
+    if "asgi" in args.modes and importlib.util.find_spec("uvicorn") is None:
+        parser.error("--modes asgi needs uvicorn (pip install uvicorn)")
+
+    data_dir = tempfile.mkdtemp(prefix="notepad-bench-")
+    # registered first so it runs last, after the stores' own atexit hooks
+    atexit.register(shutil.rmtree, data_dir, ignore_errors=True)
+    os.environ.update({
+        "NOTEPAD_DATA_DIR": data_dir,
+        "STORAGE_BACKEND": args.backend,
+        "STORAGE_MODE": args.mode,
+        "STORAGE_LAYOUT": args.layout,
+        "PASSWORD_HASH_WORKERS": str(args.hash_workers),
+        # every simulated client logs in from 127.0.0.1
+        "RATE_LIMIT_LOGIN_IP": "1000000/60",
+    })
+    sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+    from synth_data import PASSWORD
+    from werkzeug.security import generate_password_hash
+
+    password_hash = generate_password_hash(PASSWORD)
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "modes": {},
+    }
+    for mode in args.modes:
+        info = prepare_data(data_dir, args, password_hash)
+        if mode == "test_client":
+            results["modes"][mode] = run_test_client(args, info, PASSWORD)
+        else:
+            results["modes"][mode] = run_server(args, info, PASSWORD, _serve_asgi if mode == "asgi" else _serve)
+
+    print_report(results)
+    out = args.out or os.path.join(RESULTS_DIR, f"route_bench-{time.strftime('%Y%m%d-%H%M%S')}"
+                                                f"-{results['meta']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
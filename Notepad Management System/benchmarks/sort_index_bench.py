@@ -0,0 +1,94 @@
+"""Microbenchmark: per-request sort vs. the maintained SortIndex.
+
+"per-request" is what /home used to do on every view: parse both ISO
+timestamps of every note and sort the whole list. "indexed" is a page read
+from the SortIndex kept by NoteStore (bisect + slice + id lookups).
+
+    python benchmarks/sort_index_bench.py
+    python benchmarks/sort_index_bench.py --sizes 1000 10000 100000 --repeat 20
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.pagination import SORTS, slice_keys, sort_mode  # noqa: E402
+from utils.sort_index import SortIndex  # noqa: E402
+
+
+def make_notes(count):
+    start = datetime(2024, 1, 1)
+    notes = []
+    for i in range(1, count + 1):
+        created = start + timedelta(seconds=random.randint(0, 10**8))
+        updated = created + timedelta(seconds=random.randint(0, 10**6)) if random.random() < 0.5 else None
+        notes.append({
+            "id": i, "owner": "bench", "status": "active",
+            "title": "".join(random.choices(string.ascii_letters, k=12)),
+            "content": "x" * 200,
+            "created_at": created.isoformat(),
+            "updated_at": updated.isoformat() if updated else None,
+        })
+    return notes
+
+
+def per_request(notes, sort_by):
+    """The original home() body, minus rendering."""
+    notes = [dict(n) for n in notes]
+    for n in notes:
+        n["created_at_dt"] = datetime.fromisoformat(n["created_at"]) if n.get("created_at") else datetime.min
+        n["updated_at_dt"] = datetime.fromisoformat(n["updated_at"]) if n.get("updated_at") else n["created_at_dt"]
+    if sort_by == "date_asc":
+        notes.sort(key=lambda x: x["created_at_dt"])
+    elif sort_by == "title_asc":
+        notes.sort(key=lambda x: x["title"].lower())
+    elif sort_by == "title_desc":
+        notes.sort(key=lambda x: x["title"].lower(), reverse=True)
+    elif sort_by == "updated_desc":
+        notes.sort(key=lambda x: x["updated_at_dt"], reverse=True)
+    else:
+        notes.sort(key=lambda x: x["created_at_dt"], reverse=True)
+    return notes
+
+
+def indexed(index, by_id, sort_by):
+    keys = index.keys("bench", sort_mode(sort_by)[0])
+    page_keys, _ = slice_keys(keys, sort_by)
+    return [dict(by_id[k[-1]]) for k in page_keys]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'notes':>8} {'sort_by':>13} {'per-request ms':>15} {'indexed ms':>11} {'speedup':>8}")
+    for size in args.sizes:
+        notes = make_notes(size)
+        by_id = {n["id"]: n for n in notes}
+        index = SortIndex()
+        index.begin_bulk()
+        for n in notes:
+            index.add("bench", n)
+        index.end_bulk()
+
+        for sort_by in SORTS:
+            slow = min(timeit.repeat(lambda: per_request(notes, sort_by), number=1, repeat=args.repeat))
+            fast = min(timeit.repeat(lambda: indexed(index, by_id, sort_by), number=1, repeat=args.repeat))
+            print(f"{size:>8} {sort_by:>13} {slow * 1000:>15.2f} {fast * 1000:>11.3f} {slow / fast:>7.0f}x")
+
+        # cost of keeping the index current on a single edit
+        note = notes[size // 2]
+        maintain = min(timeit.repeat(lambda: (index.remove("bench", note), index.add("bench", note)),
+                                     number=100, repeat=args.repeat)) / 100
+        print(f"{size:>8} {'(edit upkeep)':>13} {'':>15} {maintain * 1000:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Multi-process stress check for the storage write path.
+
+Spawns N worker processes against a scratch data directory. Each worker
+creates notes (ids allocated by add_note) and bumps a shared counter note
+with a locked read-modify-write. Afterwards every id must be unique and the
+counter must equal the total number of increments.
+
+    python benchmarks/stress_writers.py --workers 8 --ops 200
+    python benchmarks/stress_writers.py --mode journal
+    python benchmarks/stress_writers.py --backend sqlite
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def storage_for(data_dir, config):
+    os.environ["NOTEPAD_DATA_DIR"] = data_dir
+    sys.path.insert(0, ROOT)
+    from utils import storage
+    storage.configure(config)
+    return storage
+
+
+def worker(data_dir, config, worker_no, ops):
+    storage = storage_for(data_dir, config)
+    for i in range(ops):
+        storage.add_note({"id": None, "owner": f"w{worker_no}", "title": f"note {i}",
+                          "content": "", "status": "active", "created_at": None, "updated_at": None})
+        with storage.batch_writes():
+            counter = storage.find_note_by_id(1)
+            storage.update_note(1, {"content": str(int(counter["content"]) + 1)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=100)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--mode", choices=["snapshot", "journal"], default="snapshot")
+    args = parser.parse_args()
+    config = {"STORAGE_BACKEND": args.backend, "STORAGE_MODE": args.mode, "JOURNAL_COMPACT_THRESHOLD": 50}
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        storage = storage_for(data_dir, config)
+        storage.add_note({"id": 1, "owner": "counter", "title": "counter", "content": "0",
+                          "status": "active", "created_at": None, "updated_at": None})
+
+        procs = [multiprocessing.Process(target=worker, args=(data_dir, config, w, args.ops))
+                 for w in range(args.workers)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        if any(p.exitcode for p in procs):
+            sys.exit("a worker crashed")
+
+        notes = storage.get_all_notes()
+        ids = [n["id"] for n in notes]
+        expected = args.workers * args.ops
+        counter = int(storage.find_note_by_id(1)["content"])
+        created = len(notes) - 1
+        print(f"created={created}/{expected} unique_ids={len(set(ids)) == len(ids)} counter={counter}/{expected}")
+        if created != expected or len(set(ids)) != len(ids) or counter != expected:
+            sys.exit("FAILED: lost updates or duplicate ids")
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
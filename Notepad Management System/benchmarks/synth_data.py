@@ -0,0 +1,85 @@
+"""Generate synthetic users.json / notes.json at a chosen scale.
+
+Every user gets the same password ("password", hashed once) and
+``--notes-per-user`` notes with ``--content-size`` characters of text.
+About one in five notes is archived. Output goes to ``--data-dir`` in the
+same format utils/storage.py writes.
+
+    python benchmarks/synth_data.py --data-dir /tmp/nms-data --users 100 --notes-per-user 200
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+PASSWORD = "password"
+WORDS = ("alpha beta gamma delta meeting budget draft review travel recipe grocery project "
+         "idea todo call email invoice report summary plan garden book movie music").split()
+
+
+def _text(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def generate(data_dir, users=10, notes_per_user=100, content_size=500, seed=1, password_hash=None):
+    """Write the data files and return ``{"users": [...], "notes": {username: [ids]}}``."""
+    if password_hash is None:
+        from werkzeug.security import generate_password_hash
+        password_hash = generate_password_hash(PASSWORD)
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    user_rows, note_rows = [], []
+    ids = {}
+    next_id = 1
+    for u in range(users):
+        username = f"bench{u}"
+        user_rows.append({
+            "username": username, "email": f"{username}@example.com", "password_hash": password_hash,
+            "first_name": "Bench", "middle_name": "", "last_name": str(u), "dob": "1990-01-01",
+            "age": 34, "contact": "0000000000", "address": "Benchmark Street",
+        })
+        ids[username] = []
+        for _ in range(notes_per_user):
+            created = start + timedelta(seconds=rng.randint(0, 3 * 10**7))
+            updated = created + timedelta(seconds=rng.randint(0, 10**6)) if rng.random() < 0.4 else None
+            note_rows.append({
+                "id": next_id, "owner": username,
+                "title": " ".join(rng.choice(WORDS) for _ in range(3)).title(),
+                "content": _text(rng, content_size),
+                "status": "archived" if rng.random() < 0.2 else "active",
+                "created_at": created.isoformat(),
+                "updated_at": updated.isoformat() if updated else None,
+            })
+            ids[username].append(next_id)
+            next_id += 1
+
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, "users.json"), "w") as f:
+        json.dump({"users": user_rows}, f, indent=2)
+    with open(os.path.join(data_dir, "notes.json"), "w") as f:
+        json.dump({"notes": note_rows}, f, indent=2)
+    return {"users": [u["username"] for u in user_rows], "notes": ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--notes-per-user", type=int, default=100)
+    parser.add_argument("--content-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    info = generate(args.data_dir, args.users, args.notes_per_user, args.content_size, args.seed)
+    total = sum(len(v) for v in info["notes"].values())
+    print(f"Wrote {len(info['users'])} users and {total} notes to {args.data_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
 from flask import (
-    Blueprint, render_template, request, redirect, url_for, flash, session
+    Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, abort, Response,
+    send_from_directory, make_response
 )
+from flask.globals import request_ctx
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
 from utils.storage import (
-    get_all_notes, new_note_id, add_note, find_note_by_id,
-    update_note, delete_note_permanent, find_user_by_username, update_user
+    get_notes_page, iter_notes_by_owner, search_notes, add_note, find_note_by_id, find_notes_by_ids,
+    update_note, update_notes, delete_note_permanent, delete_notes_permanent, find_user_by_username,
+    update_user, data_version
 )
-from datetime import datetime, timedelta
+from utils import fragment_cache
+from utils.fragment_cache import fragment_size
+from utils.pagination import PAGE_SIZE
+from utils import avatars, ratelimit, revisions
+from utils.avatars import AvatarError, AVATAR_FILE_RE, is_avatar_name
+from utils.notes_io import (
+    EXPORT_FORMATS, export_ndjson, export_markdown_zip, parse_ndjson, parse_markdown_zip, import_notes
+)
+from datetime import datetime, timedelta, timezone
 from werkzeug.utils import secure_filename
-import os, random
+import hashlib, random
 
 main_bp = Blueprint("main", __name__, template_folder="../templates")
 
@@ -21,6 +34,63 @@ def login_required(fn):
         return fn(*args, **kwargs)
     return wrapper
 
+# -------------------------------
+# CONDITIONAL GET (ETag / Last-Modified from per-user data versions)
+# -------------------------------
+def page_validators(*parts):
+    """``(etag, last_modified)`` for the current user's data as seen by this view.
+
+    The etag covers the user, the endpoint, ``parts`` (e.g. sort_by,
+    cursor) and the user's data version. A browser shared by two accounts
+    therefore never gets one account's page as a 304 for the other.
+    """
+    username = session["user"]
+    token, last_modified = data_version(username)
+    raw = "|".join(map(str, (username, request.endpoint, token) + parts))
+    return hashlib.sha1(raw.encode()).hexdigest()[:24], datetime.fromtimestamp(last_modified, timezone.utc)
+
+
+def not_modified(etag, last_modified):
+    """304 response if the client's copy is current, else None.
+
+    Skipped while a flash message is pending, since the cached page
+    wouldn't show it.
+    """
+    if session.get("_flashes"):
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return with_validators(make_response("", 304), etag, last_modified)
+
+
+def with_validators(response, etag, last_modified):
+    if request_ctx.flashes:
+        # the page shows one-time flash messages: a 304 later would bring them back
+        response.cache_control.no_store = True
+        return response
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    # per-user content: the browser may keep it but must revalidate each time
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
+
+
+def cached_cards(etag, status, sort_by, cursor):
+    """Rendered note cards and next cursor for one page, from the fragment
+    cache when this exact (user, version, sort_by, cursor) was seen before."""
+    cache = fragment_cache.fragment_cache
+    cached = cache.get(etag)
+    if cached is None:
+        notes, next_cursor = get_notes_page(session["user"], status, sort_by, cursor)
+        template = "_note_cards.html" if status == "active" else "_archive_cards.html"
+        cards_html = render_template(template, notes=notes) if notes else ""
+        cached = (cards_html, next_cursor)
+        cache.put(etag, cached, fragment_size(etag, cards_html, next_cursor))
+    return Markup(cached[0]), cached[1]
+
+
 @main_bp.route("/")
 def index():
     if "user" in session:
@@ -30,34 +100,94 @@ def index():
 @main_bp.route("/home")
 @login_required
 def home():
-    username = session["user"]
     sort_by = request.args.get("sort_by", "date_desc")
+    cursor = request.args.get("cursor")
+    etag, last_modified = page_validators(sort_by, cursor)
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    cards_html, next_cursor = cached_cards(etag, "active", sort_by, cursor)
+    response = make_response(render_template("home.html", cards_html=cards_html, sort_by=sort_by,
+                                             next_cursor=next_cursor))
+    return with_validators(response, etag, last_modified)
+
+
+# JSON for infinite scroll: the next page of cards as rendered HTML
+@main_bp.route("/notes/page")
+@login_required
+def notes_page():
+    status = request.args.get("status", "active")
+    if status not in ("active", "archived"):
+        abort(400)
+    sort_by = request.args.get("sort_by", "date_desc")
+    limit = request.args.get("limit", PAGE_SIZE, type=int)
+    notes, next_cursor = get_notes_page(session["user"], status, sort_by, request.args.get("cursor"), limit)
+    template = "_note_cards.html" if status == "active" else "_archive_cards.html"
+    return jsonify(html=render_template(template, notes=notes), next_cursor=next_cursor)
 
-    notes = [n for n in get_all_notes() if n.get("owner") == username and n.get("status") == "active"]
-
-    from datetime import datetime
-    for n in notes:
-        if n.get("created_at"):
-            n["created_at_dt"] = datetime.fromisoformat(n["created_at"])
-        else:
-            n["created_at_dt"] = datetime.min
-        if n.get("updated_at"):
-            n["updated_at_dt"] = datetime.fromisoformat(n["updated_at"])
-        else:
-            n["updated_at_dt"] = n["created_at_dt"]
-
-    if sort_by == "date_asc":
-        notes.sort(key=lambda x: x["created_at_dt"])
-    elif sort_by == "title_asc":
-        notes.sort(key=lambda x: x["title"].lower())
-    elif sort_by == "title_desc":
-        notes.sort(key=lambda x: x["title"].lower(), reverse=True)
-    elif sort_by == "updated_desc":
-        notes.sort(key=lambda x: x["updated_at_dt"], reverse=True)
-    else:
-        notes.sort(key=lambda x: x["created_at_dt"], reverse=True)
 
-    return render_template("home.html", notes=notes, sort_by=sort_by)
+# Full note body, fetched only when the modal opens
+@main_bp.route("/note/<int:note_id>.json")
+@login_required
+def note_json(note_id):
+    etag, last_modified = page_validators(note_id)
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    note = find_note_by_id(note_id)
+    if not note or note.get("owner") != session["user"]:
+        abort(404)
+    response = jsonify({k: note.get(k) for k in ("id", "title", "content", "status", "created_at", "updated_at")})
+    return with_validators(response, etag, last_modified)
+
+
+@main_bp.route("/search")
+@login_required
+def search():
+    q = request.args.get("q", "").strip()
+    status = request.args.get("status", "all")
+    notes = []
+    if q:
+        notes = search_notes(session["user"], q, None if status == "all" else status)
+    return render_template("search.html", notes=notes, q=q, status=status)
+
+
+# -------------------------------
+# BULK EXPORT / IMPORT
+# -------------------------------
+@main_bp.route("/notes/export")
+@login_required
+def export_notes():
+    fmt = request.args.get("format", "ndjson")
+    status = request.args.get("status") or None
+    if fmt not in EXPORT_FORMATS or status not in (None, "active", "archived"):
+        abort(400)
+    username = session["user"]
+    # generator all the way down: notes are read from storage chunk by chunk
+    notes = iter_notes_by_owner(username, status)
+    body = export_ndjson(notes) if fmt == "ndjson" else export_markdown_zip(notes)
+    mimetype, ext = EXPORT_FORMATS[fmt]
+    filename = secure_filename(f"notes-{username}-{datetime.utcnow():%Y%m%d}.{ext}")
+    return Response(body, mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+
+@main_bp.route("/notes/import", methods=["POST"])
+@login_required
+def import_notes_view():
+    file = request.files.get("file")
+    if not file or file.filename == "":
+        flash("No file selected.", "danger")
+        return redirect(url_for("main.home"))
+    if file.filename.lower().endswith(".zip"):
+        entries = parse_markdown_zip(file.stream)
+    else:
+        entries = parse_ndjson(file.stream)
+    imported, skipped, errors = import_notes(session["user"], entries)
+    flash(f"Imported {imported} note(s).", "success" if imported else "info")
+    if skipped:
+        flash(f"Skipped {skipped} invalid record(s): " + "; ".join(errors[:5]), "warning")
+    return redirect(url_for("main.home"))
 
 
 @main_bp.route("/note/new", methods=["GET", "POST"])
@@ -70,7 +200,7 @@ def create_note():
             flash("Title is required.", "danger")
             return render_template("note_form.html", form=request.form)
         note = {
-            "id": new_note_id(),
+            "id": None,  # allocated atomically by add_note()
             "owner": session["user"],
             "title": title,
             "content": content,
@@ -96,11 +226,66 @@ def edit_note(note_id):
         if not title:
             flash("Title required.", "danger")
             return render_template("note_form.html", form=request.form, note=note)
-        update_note(note_id, {"title": title, "content": content, "updated_at": datetime.utcnow().isoformat()})
+        # the previous text is kept as a compact delta in the note's history
+        revisions.update_with_revision(note, title, content)
         flash("Note updated.", "success")
         return redirect(url_for("main.home"))
     return render_template("note_form.html", note=note)
 
+
+# -------------------------------
+# REVISION HISTORY
+# -------------------------------
+@main_bp.route("/note/<int:note_id>/history")
+@login_required
+def note_history(note_id):
+    note = find_note_by_id(note_id)
+    if not note or note.get("owner") != session["user"]:
+        flash("Note not found or access denied.", "danger")
+        return redirect(url_for("main.home"))
+    return render_template("note_history.html", note=note, revisions=revisions.list_revisions(note_id))
+
+@main_bp.route("/note/<int:note_id>/history/<int:rev>")
+@login_required
+def note_revision(note_id, rev):
+    note = find_note_by_id(note_id)
+    if not note or note.get("owner") != session["user"]:
+        flash("Note not found or access denied.", "danger")
+        return redirect(url_for("main.home"))
+    revision = revisions.get_revision(note_id, rev)
+    if revision is None:
+        flash("Revision not found.", "danger")
+        return redirect(url_for("main.note_history", note_id=note_id))
+    return render_template("note_revision.html", note=note, revision=revision)
+
+@main_bp.route("/note/<int:note_id>/history/<int:rev>/restore", methods=["POST"])
+@login_required
+def restore_revision(note_id, rev):
+    note = find_note_by_id(note_id)
+    if not note or note.get("owner") != session["user"]:
+        flash("Note not found or access denied.", "danger")
+        return redirect(url_for("main.home"))
+    if not revisions.restore_revision(note, rev):
+        flash("Revision not found.", "danger")
+        return redirect(url_for("main.note_history", note_id=note_id))
+    flash(f"Restored revision {rev}.", "success")
+    return redirect(url_for("main.note_history", note_id=note_id))
+
+@main_bp.route("/note/<int:note_id>/history/diff")
+@login_required
+def note_diff(note_id):
+    note = find_note_by_id(note_id)
+    if not note or note.get("owner") != session["user"]:
+        flash("Note not found or access denied.", "danger")
+        return redirect(url_for("main.home"))
+    a = request.args.get("a", type=int)
+    b = request.args.get("b", type=int)
+    lines = revisions.diff_revisions(note_id, a, b) if a and b else None
+    if lines is None:
+        flash("Pick two existing revisions to compare.", "danger")
+        return redirect(url_for("main.note_history", note_id=note_id))
+    return render_template("note_diff.html", note=note, a=a, b=b, lines=lines)
+
 @main_bp.route("/note/<int:note_id>/archive", methods=["POST"])
 @login_required
 def archive_note(note_id):
@@ -115,9 +300,14 @@ def archive_note(note_id):
 @main_bp.route("/archive")
 @login_required
 def archive_view():
-    username = session["user"]
-    notes = [n for n in get_all_notes() if n.get("owner") == username and n.get("status") == "archived"]
-    return render_template("archive.html", notes=notes)
+    cursor = request.args.get("cursor")
+    etag, last_modified = page_validators(cursor)
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    cards_html, next_cursor = cached_cards(etag, "archived", "updated_desc", cursor)
+    response = make_response(render_template("archive.html", cards_html=cards_html, next_cursor=next_cursor))
+    return with_validators(response, etag, last_modified)
 
 @main_bp.route("/note/<int:note_id>/restore", methods=["POST"])
 @login_required
@@ -141,16 +331,110 @@ def permanent_delete(note_id):
     flash("Note permanently deleted.", "danger")
     return redirect(url_for("main.archive_view"))
 
+# action -> the status a note must be in for the action to apply
+BULK_ACTIONS = {"archive": "active", "restore": "archived", "delete": "archived"}
+BULK_MAX_IDS = 1000
+
+
+def _is_note_id(value):
+    """An int, or a string of ASCII digits (form fields are always strings)."""
+    if isinstance(value, str):
+        return value.isascii() and value.isdigit()
+    return isinstance(value, int) and not isinstance(value, bool)
+
+@main_bp.route("/notes/bulk", methods=["POST"])
+@login_required
+def bulk_notes():
+    """Archive, restore or delete many notes with one storage write.
+
+    Takes form fields (redirects with a flash) or a JSON body (answers
+    JSON): ``action`` plus either ``ids`` or ``all`` for every note the
+    action applies to, e.g. action=delete&all=1 empties the archive.
+    Ids that aren't the user's or aren't in the right status are skipped.
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    if data is not None:
+        if not isinstance(data, dict):
+            abort(400)
+        action, ids, everything = data.get("action"), data.get("ids") or [], bool(data.get("all"))
+    else:
+        action, ids, everything = request.form.get("action"), request.form.getlist("ids"), request.form.get("all") == "1"
+    status = BULK_ACTIONS.get(action)
+    if status is None:
+        abort(400)
+    owner = session["user"]
+    if everything:
+        targets = [n["id"] for n in iter_notes_by_owner(owner, status)]
+    else:
+        if not isinstance(ids, list) or not all(map(_is_note_id, ids)):
+            abort(400)
+        ids = {int(i) for i in ids}
+        if len(ids) > BULK_MAX_IDS:
+            abort(400)
+        targets = sorted(n["id"] for n in find_notes_by_ids(ids)
+                         if n.get("owner") == owner and n.get("status") == status)
+
+    if action == "delete":
+        delete_notes_permanent(targets)
+    else:
+        update_notes(targets, {"status": "archived" if action == "archive" else "active",
+                               "updated_at": datetime.utcnow().isoformat()})
+
+    if data is not None:
+        return jsonify(action=action, ids=targets)
+    if not targets:
+        flash("No notes selected.", "warning")
+    elif action == "archive":
+        flash(f"Moved {len(targets)} note(s) to archive.", "info")
+    elif action == "restore":
+        flash(f"Restored {len(targets)} note(s).", "success")
+    else:
+        flash(f"Permanently deleted {len(targets)} note(s).", "danger")
+    return redirect(url_for("main.home" if action == "archive" else "main.archive_view"))
+
 
 # -------------------------------
 # PROFILE PAGE (with picture upload and OTP)
 # -------------------------------
+AVATAR_MAX_AGE = 365 * 24 * 3600
+
+
+@main_bp.app_template_global()
+def avatar_urls(user):
+    """``(src, webp_src)`` for a user's profile picture; webp_src may be None.
+
+    Content-addressed pictures point at their thumbnail once the background
+    job has made it, otherwise at the original. Pictures uploaded before
+    content addressing still live directly in static/uploads.
+    """
+    pic = (user or {}).get("profile_pic")
+    if is_avatar_name(pic):
+        fallback, webp = avatars.avatar_store.best_variants(pic)
+        return (url_for("main.avatar", filename=fallback),
+                url_for("main.avatar", filename=webp) if webp else None)
+    return url_for("static", filename="uploads/" + (pic or "default.png")), None
+
+
+# Files are named by content hash, so they can be cached forever
+@main_bp.route("/avatars/<filename>")
+def avatar(filename):
+    if not AVATAR_FILE_RE.match(filename):
+        abort(404)
+    response = send_from_directory(avatars.avatar_store.directory, filename,
+                                   max_age=AVATAR_MAX_AGE, etag=filename)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @main_bp.route("/profile", methods=["GET"])
 @login_required
 def profile():
-    username = session["user"]
-    user = find_user_by_username(username)
-    return render_template("profile.html", user=user)
+    etag, last_modified = page_validators()
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    user = find_user_by_username(session["user"])
+    return with_validators(make_response(render_template("profile.html", user=user)), etag, last_modified)
 
 
 @main_bp.route("/profile/edit", methods=["GET", "POST"])
@@ -160,6 +444,10 @@ def edit_profile():
     user = find_user_by_username(username)
 
     if request.method == "POST":
+        # refuse oversized uploads before the multipart body is parsed
+        if request.content_length and request.content_length > avatars.avatar_store.max_bytes + 64 * 1024:
+            flash(f"Image is too large (max {avatars.avatar_store.max_bytes // (1024 * 1024)} MB).", "danger")
+            return redirect(url_for("main.edit_profile"))
         action = request.form.get("action")
 
         # Upload profile picture
@@ -174,11 +462,12 @@ def edit_profile():
                 flash("Only image files are allowed (png, jpg, jpeg, gif).", "danger")
                 return redirect(url_for("main.edit_profile"))
 
-            filename = secure_filename(file.filename)
-            upload_dir = os.path.join("static", "uploads")
-            os.makedirs(upload_dir, exist_ok=True)
-            save_path = os.path.join(upload_dir, filename)
-            file.save(save_path)
+            # streamed to disk under its content hash; thumbnails follow off-thread
+            try:
+                filename = avatars.avatar_store.save(file.stream)
+            except AvatarError as e:
+                flash(str(e), "danger")
+                return redirect(url_for("main.edit_profile"))
 
             update_user(username, {"profile_pic": filename})
             flash("Profile picture updated!", "success")
@@ -186,6 +475,7 @@ def edit_profile():
 
         # Request OTP
         elif action == "request_otp":
+            ratelimit.limiter.hit("otp_request_user", username)
             otp = f"{random.randint(0,999999):06d}"
             session["profile_otp_for"] = username
             session["profile_otp_val"] = otp
@@ -196,6 +486,7 @@ def edit_profile():
 
         # Verify OTP
         elif action == "verify_otp":
+            ratelimit.limiter.hit("otp_verify", username)
             otp = request.form.get("otp", "").strip()
             expiry = session.get("profile_otp_expiry", 0)
             if datetime.now().timestamp() > expiry:
@@ -0,0 +1,27 @@
+// Appends the next page of note cards when the "Load more" link scrolls into view.
+// The link itself still works without JS (it loads the next page as a full page).
+document.addEventListener("DOMContentLoaded", function () {
+  const grid = document.getElementById("notes-grid");
+  const loadMore = document.getElementById("load-more");
+  if (!grid || !loadMore || !("IntersectionObserver" in window)) return;
+
+  let loading = false;
+  const observer = new IntersectionObserver(entries => {
+    if (!entries[0].isIntersecting || loading) return;
+    loading = true;
+    const url = loadMore.dataset.pageUrl + "&cursor=" + encodeURIComponent(loadMore.dataset.cursor);
+    fetch(url, { headers: { Accept: "application/json" } })
+      .then(r => r.json())
+      .then(data => {
+        grid.insertAdjacentHTML("beforeend", data.html);
+        if (data.next_cursor) {
+          loadMore.dataset.cursor = data.next_cursor;
+        } else {
+          observer.disconnect();
+          loadMore.remove();
+        }
+      })
+      .finally(() => { loading = false; });
+  });
+  observer.observe(loadMore);
+});
@@ -0,0 +1,188 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from utils import hashing, jobs, storage
+
+ASGI_THREADS = 16
+# requests allowed to wait for a thread before new ones get 503
+ASGI_BACKLOG = 64
+# request bodies above this spill from memory to a temp file
+BODY_MEMORY_LIMIT = 1024 * 1024
+# response chunks are gathered up to this size per trip to the pool
+SEND_CHUNK = 64 * 1024
+
+BUSY_BODY = b"Server is busy, please try again shortly."
+
+
+class AsgiAdapter:
+    """Serves the Flask (WSGI) app to an ASGI server such as uvicorn.
+
+    The event loop only does socket I/O. Each request's handler runs in a
+    bounded thread pool, so blocking storage calls (a notes.json rewrite, a
+    SQLite write, waiting on the hash pool) occupy a pool thread, never the
+    loop, and unrelated requests keep being accepted and served. Once
+    ``threads + backlog`` requests are in flight, new ones get 503 instead
+    of queueing without limit.
+
+    On lifespan shutdown it waits for in-flight handlers, then runs the
+    ``on_shutdown`` callbacks (by default flush_pending_writes()).
+    """
+
+    def __init__(self, wsgi_app, threads=ASGI_THREADS, backlog=ASGI_BACKLOG, on_shutdown=()):
+        self.wsgi_app = wsgi_app
+        self.limit = threads + backlog
+        self.on_shutdown = list(on_shutdown)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi")
+        self._in_flight = 0
+        self._draining = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    # ---------- lifespan ----------
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def shutdown(self):
+        """Stop taking requests, wait for running handlers, then flush."""
+        self._draining = True
+        self._executor.shutdown(wait=True)
+        for callback in self.on_shutdown:
+            callback()
+
+    # ---------- http ----------
+    async def _http(self, scope, receive, send):
+        if self._draining or self._in_flight >= self.limit:
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"retry-after", b"1")]})
+            await send({"type": "http.response.body", "body": BUSY_BODY})
+            return
+        self._in_flight += 1
+        body = SpooledTemporaryFile(max_size=BODY_MEMORY_LIMIT)
+        try:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body.write(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            body.seek(0)
+            loop = asyncio.get_running_loop()
+            environ = self._environ(scope, body)
+            status, headers, iterable, chunk, done = await loop.run_in_executor(self._executor, self._start, environ)
+            try:
+                await send({"type": "http.response.start", "status": status, "headers": headers})
+                while not done:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                    chunk, done = await loop.run_in_executor(self._executor, self._gather, iterable)
+                await send({"type": "http.response.body", "body": chunk})
+            finally:
+                close = getattr(iterable, "close", None)
+                if close is not None:
+                    await loop.run_in_executor(self._executor, close)
+        finally:
+            body.close()
+            self._in_flight -= 1
+
+    def _start(self, environ):
+        """Run the WSGI app up to its first chunk of output (pool thread)."""
+        response = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+            return written.append
+
+        iterable = self.wsgi_app(environ, start_response)
+        if not hasattr(iterable, "__next__"):
+            iterable = iter(iterable)  # e.g. a list; keep one iterator across trips
+        chunk, done = self._gather(iterable)
+        return response["status"], response["headers"], iterable, b"".join(written) + chunk, done
+
+    @staticmethod
+    def _gather(iterator):
+        """Up to SEND_CHUNK bytes of output and whether the body is finished."""
+        parts = []
+        size = 0
+        for part in iterator:
+            parts.append(part)
+            size += len(part)
+            if size >= SEND_CHUNK:
+                return b"".join(parts), False
+        return b"".join(parts), True
+
+    @staticmethod
+    def _environ(scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        root_path = scope.get("root_path", "")
+        path = scope["path"]
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            # WSGI carries the raw bytes as latin-1 strings
+            "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+            "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": body,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope.get("headers", ()):
+            name = name.decode("latin-1")
+            if name == "content-type":
+                key = "CONTENT_TYPE"
+            elif name == "content-length":
+                key = "CONTENT_LENGTH"
+            else:
+                key = "HTTP_" + name.upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if key in environ:
+                value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+            environ[key] = value
+        return environ
+
+
+def flush_pending_writes():
+    """Finish background work that ends in a write, then settle storage."""
+    hashing.hash_pool.shutdown()      # queued password re-hashes call update_user
+    jobs.queue.shutdown()             # let running jobs finish; queued ones wait for the next start
+    storage.compact_storage()         # fold journals into snapshots / checkpoint the WAL
+
+
+def create_asgi_app(app):
+    """Wrap a Flask app for ASGI servers, sized by ASGI_THREADS / ASGI_BACKLOG."""
+    return AsgiAdapter(
+        app,
+        threads=int(app.config.get("ASGI_THREADS", ASGI_THREADS)),
+        backlog=int(app.config.get("ASGI_BACKLOG", ASGI_BACKLOG)),
+        on_shutdown=[flush_pending_writes],
+    )
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are skipped, originals are still served
+    Image = None
+
+from utils import jobs
+
+AVATAR_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "uploads", "avatars")
+MAX_AVATAR_BYTES = 2 * 1024 * 1024
+THUMB_SIZE = 256
+GC_GRACE_SECONDS = 3600
+CHUNK_SIZE = 64 * 1024
+
+# magic bytes -> extension; the upload's own filename is never trusted
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+PIL_FORMATS = {"png": "PNG", "jpg": "JPEG", "gif": "GIF", "webp": "WEBP"}
+AVATAR_NAME_RE = re.compile(r"^[0-9a-f]{64}\.(png|jpg|gif)$")
+AVATAR_FILE_RE = re.compile(r"^([0-9a-f]{64})(?:-\d+)?\.(png|jpg|gif|webp)$")
+
+
+class AvatarError(ValueError):
+    """Upload rejected (too large or not an image); the message is user-facing."""
+
+
+def _sniff(head):
+    for magic, ext in SIGNATURES:
+        if head.startswith(magic):
+            return ext
+    return None
+
+
+def is_avatar_name(name):
+    """True for content-addressed names (``<sha256>.<ext>``) as stored in profile_pic."""
+    return bool(name) and bool(AVATAR_NAME_RE.match(name))
+
+
+class AvatarStore:
+    """Content-addressed profile pictures.
+
+    Each upload is streamed to disk in chunks while being hashed, so it's
+    never buffered in memory and can be cut off at ``max_bytes``. The file
+    is stored as ``<sha256>.<ext>``; identical uploads share one file.
+    Thumbnails (``<sha256>-<size>.<ext>`` plus a ``.webp`` twin) are made
+    by a queued job. Until they exist, pages fall back to the original.
+    """
+
+    def __init__(self, directory=AVATAR_DIR, max_bytes=MAX_AVATAR_BYTES, thumb_size=THUMB_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.thumb_size = thumb_size
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def save(self, stream):
+        """Store an uploaded file stream; return its ``<sha256>.<ext>`` name."""
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise AvatarError(f"Image is too large (max {self.max_bytes // (1024 * 1024)} MB).")
+                    if len(head) < 16:
+                        head += chunk[:16]
+                    digest.update(chunk)
+                    out.write(chunk)
+            ext = _sniff(head)
+            if ext is None:
+                raise AvatarError("Only image files are allowed (png, jpg, jpeg, gif).")
+            name = f"{digest.hexdigest()}.{ext}"
+            if os.path.exists(self.path(name)):
+                os.remove(tmp_path)  # already stored by an earlier upload
+            else:
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, self.path(name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._schedule_thumbnails(name)
+        return name
+
+    # ---------- variants ----------
+    def variant_names(self, name):
+        stem, ext = name.rsplit(".", 1)
+        return f"{stem}-{self.thumb_size}.{ext}", f"{stem}-{self.thumb_size}.webp"
+
+    def best_variants(self, name):
+        """``(fallback, webp)`` filenames to serve for ``name``; webp may be None."""
+        thumb, webp = self.variant_names(name)
+        return (thumb if os.path.exists(self.path(thumb)) else name,
+                webp if os.path.exists(self.path(webp)) else None)
+
+    def _schedule_thumbnails(self, name):
+        if Image is None:
+            return
+        # persisted, so a restart before it runs doesn't lose the thumbnails
+        jobs.queue.enqueue("avatar_thumbnails", {"name": name}, key=f"thumbnails:{name}")
+
+    def make_thumbnails(self, name):
+        thumb, webp = self.variant_names(name)
+        if os.path.exists(self.path(thumb)) and os.path.exists(self.path(webp)):
+            return
+        try:
+            with Image.open(self.path(name)) as img:
+                img.thumbnail((self.thumb_size, self.thumb_size))
+                if name.endswith(".jpg") and img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                for target in (thumb, webp):
+                    fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".thumb-")
+                    with os.fdopen(fd, "wb") as out:
+                        img.save(out, format=PIL_FORMATS[target.rsplit(".", 1)[1]])
+                    os.chmod(tmp_path, 0o644)
+                    os.replace(tmp_path, self.path(target))
+        except (OSError, ValueError):
+            # undecodable image: keep serving the original
+            pass
+
+    # ---------- cleanup ----------
+    def collect_garbage(self, referenced, grace_seconds=GC_GRACE_SECONDS):
+        """Delete stored files whose hash no name in ``referenced`` points to.
+
+        Files younger than ``grace_seconds`` are kept, so an upload whose
+        user record hasn't been written yet isn't collected. Returns the
+        number of files removed.
+        """
+        keep = {n.split(".", 1)[0] for n in referenced if is_avatar_name(n)}
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            if entry.name.startswith((".upload-", ".thumb-")):
+                digest = None  # leftovers from a crashed upload/thumbnail job
+            else:
+                m = AVATAR_FILE_RE.match(entry.name)
+                if not m:
+                    continue
+                digest = m.group(1)
+            if digest in keep or entry.stat().st_mtime > cutoff:
+                continue
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+avatar_store = AvatarStore()
+
+
+def configure(config):
+    global avatar_store
+    avatar_store = AvatarStore(
+        directory=config.get("AVATAR_DIR") or AVATAR_DIR,
+        max_bytes=int(config.get("AVATAR_MAX_BYTES", MAX_AVATAR_BYTES)),
+        thumb_size=int(config.get("AVATAR_THUMB_SIZE", THUMB_SIZE)),
+    )
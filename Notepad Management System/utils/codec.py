@@ -0,0 +1,85 @@
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:  # stdlib json is used instead
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # the "zstd" format is unavailable; gzip still works
+    zstandard = None
+
+# "pretty" is the historical indent=2 layout; "compact" drops the whitespace
+FORMATS = ("pretty", "compact", "gzip", "zstd")
+DEFAULT_FORMAT = "compact"
+DEFAULT_LEVELS = {"gzip": 1, "zstd": 3}  # writes are on the request path: favour speed
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+if orjson is not None:
+    # datetimes go through default=str, as they always have with stdlib json
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(obj, pretty=False) -> bytes:
+    """UTF-8 JSON for ``obj``; values JSON can't hold are written as str()."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=_ORJSON_OPTS | (orjson.OPT_INDENT_2 if pretty else 0))
+    if pretty:
+        return json.dumps(obj, indent=2, default=str, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), default=str, ensure_ascii=False).encode("utf-8")
+
+
+def loads(data):
+    """Parse JSON from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def detect_format(data: bytes) -> str:
+    """Which format wrote ``data``; plain JSON (either layout) reads as "compact"."""
+    if data.startswith(GZIP_MAGIC):
+        return "gzip"
+    if data.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return "compact"
+
+
+class Codec:
+    """Encodes documents for the data files in one ``format`` and decodes any.
+
+    Reading sniffs the compression magic bytes, so files written before a
+    format change (including the original pretty-printed JSON) keep loading
+    and are converted the next time they are saved.
+    """
+
+    def __init__(self, format=DEFAULT_FORMAT, level=None):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown STORAGE_FORMAT: {format}")
+        if format == "zstd" and zstandard is None:
+            raise ValueError("STORAGE_FORMAT=zstd needs the zstandard package")
+        self.format = format
+        self.level = DEFAULT_LEVELS.get(format) if level is None else int(level)
+
+    def encode(self, obj) -> bytes:
+        data = dumps(obj, pretty=self.format == "pretty")
+        if self.format == "gzip":
+            # mtime=0 so identical documents give identical bytes
+            return gzip.compress(data, compresslevel=self.level, mtime=0)
+        if self.format == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return data
+
+    def decode(self, data: bytes):
+        kind = detect_format(data)
+        if kind == "gzip":
+            data = gzip.decompress(data)
+        elif kind == "zstd":
+            if zstandard is None:
+                raise ValueError("file is zstd-compressed but the zstandard package is not installed")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return loads(data)
@@ -0,0 +1,62 @@
+import sys
+import threading
+from collections import OrderedDict
+
+FRAGMENT_CACHE_BYTES = 8 * 1024 * 1024
+
+
+class FragmentCache:
+    """LRU cache of rendered page fragments, bounded by total size in bytes.
+
+    Keys embed the owner's data version, so entries are never invalidated
+    explicitly. Once a note changes, the old key simply stops being asked
+    for and ages out.
+    """
+
+    def __init__(self, max_bytes=FRAGMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+def fragment_size(*parts):
+    return sum(sys.getsizeof(p) for p in parts)
+
+
+fragment_cache = FragmentCache()
+
+
+def configure(config):
+    global fragment_cache
+    fragment_cache = FragmentCache(int(config.get("FRAGMENT_CACHE_BYTES", FRAGMENT_CACHE_BYTES)))
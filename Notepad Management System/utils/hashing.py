@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hashing queue is full; the app answers 503 + Retry-After."""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Password hashing queue is full.")
+        self.retry_after = retry_after
+
+
+class HashPool:
+    """Runs password KDF work in a process pool behind a bounded queue.
+
+    At most ``workers + queue_size`` hashes are in flight; anything beyond
+    that is rejected straight away with HashPoolBusy instead of piling up
+    on request threads. With ``workers=0`` hashing runs inline (no pool).
+    """
+
+    def __init__(self, workers=0, queue_size=0, method="scrypt", timeout=30, retry_after=1):
+        self.workers = workers
+        self.method = method
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._target_prefix = None
+        self.in_flight = 0
+        self.rejected = 0
+        self.latency_count = 0
+        self.latency_sum_ms = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def _get_executor(self):
+        # created lazily so each forked worker process gets its own pool
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _record(self, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self.in_flight -= 1
+            self.latency_count += 1
+            self.latency_sum_ms += elapsed_ms
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    self.latency_buckets[i] += 1
+                    break
+            else:
+                self.latency_buckets[-1] += 1
+
+    def _submit(self, fn, *args, block_on_full=True):
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            if block_on_full:
+                raise HashPoolBusy(self.retry_after)
+            return None
+        with self._stats_lock:
+            self.in_flight += 1
+        started = time.perf_counter()
+        if self._slots is None:
+            try:
+                return _Done(fn(*args))
+            finally:
+                self._record(started)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._record(started)
+            self._slots.release()
+            raise
+
+        def done(_):
+            self._record(started)
+            self._slots.release()
+
+        future.add_done_callback(done)
+        return future
+
+    def hash(self, plain):
+        return self._submit(generate_password_hash, plain, self.method).result(self.timeout)
+
+    def verify(self, hashed, plain):
+        return self._submit(check_password_hash, hashed, plain).result(self.timeout)
+
+    def needs_rehash(self, hashed):
+        if self._target_prefix is None:
+            self._target_prefix = generate_password_hash("", self.method).split("$", 1)[0]
+        return hashed.split("$", 1)[0] != self._target_prefix
+
+    def rehash_in_background(self, plain, on_done):
+        """Hash ``plain`` off-thread and pass the result to ``on_done``.
+
+        Best effort: silently skipped when the queue is full, the next login
+        will try again.
+        """
+        if self._slots is None:
+            on_done(self.hash(plain))
+            return
+        future = self._submit(generate_password_hash, plain, self.method, block_on_full=False)
+
+        def done(f):
+            if f.exception() is None:
+                on_done(f.result())
+
+        if future is not None:
+            future.add_done_callback(done)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "in_flight": self.in_flight,
+                "rejected": self.rejected,
+                "latency_count": self.latency_count,
+                "latency_sum_ms": self.latency_sum_ms,
+                "latency_buckets": dict(zip(LATENCY_BUCKETS_MS + ("+Inf",), self.latency_buckets)),
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+class _Done:
+    """Future-like wrapper for a result computed inline."""
+
+    def __init__(self, value):
+        self._value = value
+
+    def result(self, timeout=None):
+        return self._value
+
+    def exception(self, timeout=None):
+        return None
+
+    def add_done_callback(self, fn):
+        fn(self)
+
+
+hash_pool = HashPool()
+
+
+def configure(config):
+    global hash_pool
+    workers = int(config.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+    hash_pool = HashPool(
+        workers=workers,
+        queue_size=int(config.get("PASSWORD_HASH_QUEUE", workers * 4)),
+        method=config.get("PASSWORD_HASH_METHOD", "scrypt"),
+        retry_after=int(config.get("PASSWORD_HASH_RETRY_AFTER", 1)),
+    )
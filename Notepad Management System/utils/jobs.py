@@ -0,0 +1,356 @@
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from utils import codec
+from utils.sqlite_util import make_store, thread_connection
+
+JOB_WORKERS = 2
+MAX_ATTEMPTS = 5
+# first retry after ~BACKOFF_BASE seconds, doubling per attempt up to BACKOFF_MAX
+BACKOFF_BASE = 10
+BACKOFF_MAX = 3600
+# a claimed job not finished within this long is assumed lost with its worker
+LEASE_SECONDS = 600
+POLL_INTERVAL = 5
+SCHEDULE_TICK = 60
+
+log = logging.getLogger(__name__)
+
+# job name -> handler; handlers are called with the job's payload as keyword arguments
+TASKS = {}
+
+
+def task(name):
+    """Register the decorated function as the handler for jobs called ``name``."""
+    def register(fn):
+        TASKS[name] = fn
+        return fn
+    return register
+
+
+def backoff(attempts, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Seconds to wait after failed attempt number ``attempts`` (jittered)."""
+    return min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+
+class MemoryJobStore:
+    """In-process queue; jobs are lost on restart. For tests and one-off runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}       # id -> dict(name, payload, status, attempts, max_attempts, run_at, key, error)
+        self._schedules = {}  # name -> next run
+        self._next_id = 1
+
+    def add(self, name, payload, run_at, max_attempts, key=None):
+        with self._lock:
+            if key is not None and any(j["key"] == key for j in self._jobs.values()):
+                return None
+            job_id = self._next_id
+            self._next_id += 1
+            self._jobs[job_id] = {"name": name, "payload": payload, "status": "queued", "attempts": 0,
+                                  "max_attempts": max_attempts, "run_at": run_at, "key": key, "error": None}
+            return job_id
+
+    def claim(self, now, lease):
+        with self._lock:
+            due = [(j["run_at"], i) for i, j in self._jobs.items() if j["status"] != "failed" and j["run_at"] <= now]
+            if not due:
+                return None
+            job_id = min(due)[1]
+            job = self._jobs[job_id]
+            job.update(status="running", attempts=job["attempts"] + 1, run_at=now + lease)
+            return job_id, job["name"], job["payload"], job["attempts"], job["max_attempts"]
+
+    def finish(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def retry(self, job_id, run_at, error):
+        with self._lock:
+            self._jobs[job_id].update(status="queued", run_at=run_at, error=error)
+
+    def fail(self, job_id, error):
+        with self._lock:
+            self._jobs[job_id].update(status="failed", key=None, error=error)
+
+    def next_run(self):
+        with self._lock:
+            return min((j["run_at"] for j in self._jobs.values() if j["status"] != "failed"), default=None)
+
+    def claim_schedule(self, name, interval, now):
+        with self._lock:
+            # first seen: start counting now rather than running at boot
+            next_run = self._schedules.setdefault(name, now + interval)
+            if next_run > now:
+                return False
+            self._schedules[name] = now + interval
+            return True
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+
+class SqliteJobStore:
+    """Jobs in a SQLite file, so they survive restarts and are shared by workers.
+
+    A claimed job's ``run_at`` becomes its lease expiry: if the process
+    running it dies, the job is simply due again once the lease runs out.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        payload BLOB NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        run_at REAL NOT NULL,
+        key TEXT,
+        error TEXT,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (status, run_at);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_key ON jobs (key) WHERE key IS NOT NULL;
+    CREATE TABLE IF NOT EXISTS job_schedules (
+        name TEXT PRIMARY KEY,
+        next_run REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        return thread_connection(self._local, self.path, isolation_level=None)
+
+    def add(self, name, payload, run_at, max_attempts, key=None):
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO jobs (name, payload, status, max_attempts, run_at, key, created_at)"
+            " VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+            (name, payload, max_attempts, run_at, key, time.time()),
+        )
+        return cur.lastrowid if cur.rowcount else None
+
+    def claim(self, now, lease):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, name, payload, attempts, max_attempts FROM jobs"
+                " WHERE status IN ('queued', 'running') AND run_at <= ? ORDER BY run_at, id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, run_at = ? WHERE id = ?",
+                         (now + lease, row[0]))
+        finally:
+            conn.execute("COMMIT")
+        return row[0], row[1], row[2], row[3] + 1, row[4]
+
+    def finish(self, job_id):
+        self._conn().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def retry(self, job_id, run_at, error):
+        self._conn().execute("UPDATE jobs SET status = 'queued', run_at = ?, error = ? WHERE id = ?",
+                             (run_at, error, job_id))
+
+    def fail(self, job_id, error):
+        # keep the row for inspection, but let the same key be queued again
+        self._conn().execute("UPDATE jobs SET status = 'failed', key = NULL, error = ? WHERE id = ?",
+                             (error, job_id))
+
+    def next_run(self):
+        return self._conn().execute(
+            "SELECT MIN(run_at) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def claim_schedule(self, name, interval, now):
+        """True (once, across all workers) if periodic job ``name`` is due."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT next_run FROM job_schedules WHERE name = ?", (name,)).fetchone()
+            # first seen: start counting now rather than running at boot
+            if row is None or row[0] > now:
+                if row is None:
+                    conn.execute("INSERT INTO job_schedules (name, next_run) VALUES (?, ?)", (name, now + interval))
+                return False
+            conn.execute("UPDATE job_schedules SET next_run = ? WHERE name = ?", (now + interval, name))
+            return True
+        finally:
+            conn.execute("COMMIT")
+
+    def counts(self):
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+class JobQueue:
+    """Deferred work run by a small pool of worker threads.
+
+    Request handlers enqueue a job (one row insert) and return; a worker
+    runs it shortly after. A job that raises is retried with exponential
+    backoff until ``max_attempts``, then kept as "failed". Periodic jobs
+    registered with every() are enqueued by a scheduler thread, at most
+    once per interval across all worker processes.
+
+    Threads are started lazily per process, like the session reaper. With
+    ``workers=0`` nothing runs in the background: enqueue() runs due jobs
+    inline, and `flask run-jobs` (e.g. from cron) runs periodic ones.
+    """
+
+    def __init__(self, store, workers=JOB_WORKERS, poll_interval=POLL_INTERVAL, lease=LEASE_SECONDS):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.schedules = {}  # name -> (interval seconds, payload)
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    # ---------- producing ----------
+    def enqueue(self, name, payload=None, delay=0, max_attempts=MAX_ATTEMPTS, key=None):
+        """Queue job ``name``; returns its id, or None if ``key`` is already queued."""
+        if name not in TASKS:
+            raise KeyError(f"Unknown job: {name}")
+        job_id = self.store.add(name, codec.dumps(payload or {}), time.time() + delay, max_attempts, key)
+        if self.workers:
+            self.ensure_running()
+            self._wake.set()
+        elif not delay:
+            self.run_pending()
+        return job_id
+
+    def every(self, name, interval, payload=None):
+        """Run job ``name`` every ``interval`` seconds (0 disables it)."""
+        if name not in TASKS:
+            raise KeyError(f"Unknown job: {name}")
+        if interval:
+            self.schedules[name] = (interval, payload or {})
+
+    def enqueue_due(self, now=None):
+        """Queue every periodic job whose interval has elapsed."""
+        now = time.time() if now is None else now
+        queued = 0
+        for name, (interval, payload) in self.schedules.items():
+            # the key keeps a backlog from piling up while no worker is running
+            if self.store.claim_schedule(name, interval, now):
+                if self.store.add(name, codec.dumps(payload), now, MAX_ATTEMPTS, key=f"every:{name}"):
+                    queued += 1
+        if queued and self.workers:
+            self._wake.set()
+        return queued
+
+    # ---------- consuming ----------
+    def run_one(self, now=None):
+        """Claim and run one due job; False if none was due."""
+        claimed = self.store.claim(time.time() if now is None else now, self.lease)
+        if claimed is None:
+            return False
+        job_id, name, payload, attempts, max_attempts = claimed
+        handler = TASKS.get(name)
+        if attempts > max_attempts:
+            # its lease ran out on every attempt: it keeps taking its worker down
+            log.error("job %s #%s abandoned after %d attempt(s)", name, job_id, max_attempts)
+            self.store.fail(job_id, "lease expired")
+            return True
+        try:
+            if handler is None:
+                raise KeyError(f"Unknown job: {name}")
+            handler(**codec.loads(payload))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if handler is not None and attempts < max_attempts:
+                delay = backoff(attempts)
+                log.warning("job %s #%s failed (attempt %d/%d), retrying in %.0fs: %s",
+                            name, job_id, attempts, max_attempts, delay, error)
+                self.store.retry(job_id, time.time() + delay, error)
+            else:
+                log.error("job %s #%s failed for good after %d attempt(s): %s", name, job_id, attempts, error)
+                self.store.fail(job_id, error)
+        else:
+            self.store.finish(job_id)
+        return True
+
+    def run_pending(self):
+        """Run jobs until none is due; returns how many ran."""
+        ran = 0
+        while self.run_one():
+            ran += 1
+        return ran
+
+    # ---------- threads ----------
+    def ensure_running(self):
+        if self._pid == os.getpid() or not self.workers:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # a forked worker doesn't inherit the parent's threads
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                             for i in range(self.workers)]
+            if self.schedules:
+                self._threads.append(threading.Thread(target=self._schedule, name="job-scheduler", daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                if self.run_one():
+                    continue
+                next_run = self.store.next_run()
+            except sqlite3.Error:
+                next_run = None  # e.g. database busy; try again after a poll
+            timeout = self.poll_interval
+            if next_run is not None:
+                timeout = min(timeout, max(0.0, next_run - time.time()))
+            self._wake.wait(timeout)
+
+    def _schedule(self):
+        tick = min([SCHEDULE_TICK] + [interval for interval, _ in self.schedules.values()])
+        while not self._stopping.is_set():
+            try:
+                self.enqueue_due()
+            except sqlite3.Error:
+                pass
+            self._stopping.wait(tick)
+
+    def shutdown(self):
+        """Stop the threads once their current job is done; queued jobs stay queued."""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._pid = None
+
+
+queue = JobQueue(MemoryJobStore(), workers=0)
+
+
+def configure(config, data_dir):
+    """Build the queue from JOB_BACKEND ("sqlite" keeps jobs in
+    ``<data_dir>/jobs.db`` across restarts; "memory" is per process)."""
+    global queue
+    store = make_store(config, "JOB", MemoryJobStore, SqliteJobStore, os.path.join(data_dir, "jobs.db"))
+    queue = JobQueue(store, workers=int(config.get("JOB_WORKERS", JOB_WORKERS)),
+                     poll_interval=float(config.get("JOB_POLL_INTERVAL", POLL_INTERVAL)))
@@ -0,0 +1,69 @@
+import os
+
+from utils import codec
+
+
+class Journal:
+    """Append-only log of record mutations, one compact JSON object per line.
+
+    (FileRevisionStore reuses it for per-note revision logs, whose lines are
+    revision records rather than ops.) Ops look like ``{"op": "insert", "record": {...}}``,
+    ``{"op": "update", "key": ..., "fields": {...}}``,
+    ``{"op": "delete", "key": ...}`` or ``{"op": "replace", "records": [...]}``.
+    All of them are idempotent, so replaying a journal over a snapshot that
+    already contains some of its ops gives the same result.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._count = None
+
+    def __len__(self):
+        if self._count is None:
+            self._count = len(self.entries())
+        return self._count
+
+    def append(self, op: dict):
+        self.append_many([op])
+
+    def append_many(self, ops):
+        lines = b"".join(codec.dumps(op) + b"\n" for op in ops)
+        with open(self.path, "a+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    # a crash left a torn last line: start on a fresh one,
+                    # or these ops would be glued to it and lost with it
+                    lines = b"\n" + lines
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        if self._count is not None:
+            self._count += len(ops)
+
+    def entries(self):
+        ops = []
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    try:
+                        ops.append(codec.loads(line))
+                    except ValueError:
+                        # torn write from a crash (appends after it start on a
+                        # new line), or one still being written by another process
+                        continue
+        except FileNotFoundError:
+            pass
+        self._count = len(ops)
+        return ops
+
+    def truncate(self):
+        with open(self.path, "w"):
+            pass
+        self._count = 0
+
+
+def journal_path(snapshot_path: str) -> str:
+    root, _ = os.path.splitext(snapshot_path)
+    return root + ".journal.jsonl"
@@ -0,0 +1,213 @@
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+
+from utils.journal import Journal, journal_path
+from utils.note_shards import ShardedNoteStore
+from utils.note_store import NoteStore
+from utils.revision_store import FileRevisionStore
+from utils.user_store import UserStore
+from utils.versions import VersionStore
+
+
+class JsonBackend:
+    """Storage backed by data/users.json and data/notes.json.
+
+    "snapshot" mode rewrites the JSON file on every mutation; "journal" mode
+    appends to <name>.journal.jsonl and compacts periodically.
+
+    The "sharded" layout keeps each owner's notes in its own file under
+    data/notes/ instead of one notes.json (migrated from it on first use).
+
+    Every mutation bumps the affected users' entries in data/versions.json
+    once its data is on disk, holding the written file's lock where one
+    covers the whole write; inside batch() the bumps wait for the commit.
+    """
+
+    def __init__(self, users_file, notes_file, load, dump, mode="snapshot", compact_threshold=500,
+                 layout="single"):
+        if mode not in ("snapshot", "journal"):
+            raise ValueError(f"Unknown STORAGE_MODE: {mode}")
+        if layout not in ("single", "sharded"):
+            raise ValueError(f"Unknown STORAGE_LAYOUT: {layout}")
+
+        def journal_for(path):
+            return Journal(journal_path(path)) if mode == "journal" else None
+
+        self.users = UserStore(users_file, load=load, dump=dump,
+                               journal=journal_for(users_file), compact_threshold=compact_threshold)
+        self.layout = layout
+        if layout == "sharded":
+            self.notes = ShardedNoteStore(os.path.join(os.path.dirname(notes_file), "notes"), load=load, dump=dump,
+                                          mode=mode, compact_threshold=compact_threshold, migrate_from=notes_file)
+        else:
+            self.notes = NoteStore(notes_file, load=load, dump=dump,
+                                   journal=journal_for(notes_file), compact_threshold=compact_threshold,
+                                   index_path=os.path.splitext(notes_file)[0] + ".index.pickle")
+        self.revisions = FileRevisionStore(os.path.join(os.path.dirname(notes_file), "revisions"))
+        versions_file = os.path.join(os.path.dirname(notes_file), "versions.json")
+        self.versions = VersionStore(versions_file, load=load, dump=dump,
+                                     journal=journal_for(versions_file), compact_threshold=compact_threshold)
+        self._local = threading.local()
+
+    # ---------- version bumps ----------
+    def _changed(self, *usernames):
+        pending = getattr(self._local, "pending", None)
+        if pending is not None:
+            pending.update(usernames)
+        else:
+            self.versions.bump(usernames)
+
+    def _notes_lock(self, owner=None):
+        """Write lock of the file holding ``owner``'s notes (None: all notes)."""
+        if self.layout == "single":
+            return self.notes._write_lock
+        if owner is not None:
+            return self.notes.shard(owner)._write_lock
+        return nullcontext()  # spans several shards; bumped after they're all written
+
+    # users
+    def find_user_by_username(self, username):
+        return self.users.get(username)
+
+    def find_user_by_email(self, email):
+        return self.users.find_by_email(email)
+
+    def all_users(self):
+        return self.users.all()
+
+    def add_user(self, user):
+        with self.users._write_lock:
+            self.users.insert_unique(user)
+            self._changed(user["username"])
+
+    def update_user(self, username, fields):
+        with self.users._write_lock:
+            updated = self.users.update(username, fields)
+            if updated:
+                self._changed(username)
+            return updated
+
+    # notes
+    def all_notes(self):
+        return self.notes.all()
+
+    def notes_by_owner(self, owner, status=None):
+        return self.notes.by_owner(owner, status)
+
+    def iter_notes_by_owner(self, owner, status=None):
+        return self.notes.iter_owner(owner, status)
+
+    def notes_page(self, owner, status, sort_by, cursor, limit):
+        return self.notes.page(owner, status, sort_by, cursor, limit)
+
+    def search_notes(self, owner, query, status, limit):
+        return self.notes.search(owner, query, status, limit)
+
+    def replace_notes(self, notes):
+        with self._notes_lock():
+            owners = {n.get("owner") for n in self.notes.all()} | {n.get("owner") for n in notes}
+            self.notes.replace_all(notes)
+            self._changed(*owners)
+
+    def next_note_id(self):
+        return self.notes.next_id()
+
+    def add_note(self, note):
+        owner = note.get("owner")
+        with self._notes_lock(owner):
+            if note.get("id") is None:
+                note_id = self.notes.insert_new(note)
+                self._changed(owner)
+                return note_id
+            previous = self.notes.get(note["id"])  # re-inserting an id can move it between owners
+            self.notes.insert(note)
+            self._changed(owner, previous and previous.get("owner"))
+            return note["id"]
+
+    @contextmanager
+    def batch(self):
+        if getattr(self._local, "pending", None) is not None:
+            with self.notes.batch():
+                yield
+            return
+        self._local.pending = set()
+        try:
+            with self._notes_lock():
+                with self.notes.batch():
+                    yield
+                self.versions.bump(self._local.pending)
+        finally:
+            self._local.pending = None
+
+    def get_note(self, note_id):
+        return self.notes.get(note_id)
+
+    def update_note(self, note_id, fields):
+        note = self.notes.get(note_id)
+        if note is None:
+            return False
+        with self._notes_lock(note.get("owner")):
+            updated = self.notes.update(note_id, fields)
+            if updated:
+                self._changed(note.get("owner"), fields.get("owner"))
+            return updated
+
+    def delete_note(self, note_id):
+        note = self.notes.get(note_id)
+        if note is None:
+            return False
+        with self._notes_lock(note.get("owner")):
+            deleted = self.notes.delete(note_id)
+            if deleted:
+                self._changed(note.get("owner"))
+            return deleted
+
+    # revisions
+    def note_revisions(self, note_id):
+        return self.revisions.get(note_id)
+
+    def append_revisions(self, note_id, records):
+        return self.revisions.append(note_id, records)
+
+    def replace_revisions(self, note_id, records):
+        self.revisions.replace(note_id, records)
+
+    def delete_revisions(self, note_id):
+        self.revisions.delete(note_id)
+
+    def revision_note_ids(self):
+        return self.revisions.note_ids()
+
+    def data_version(self, username):
+        """``(token, last_modified)`` from the user's entry in versions.json.
+
+        A user without one (data written before versions.json existed) falls
+        back to the stat signatures of users.json and the file(s) holding
+        their notes, which any write moves.
+        """
+        version = self.versions.token(username)
+        if version is not None:
+            return version
+        if self.layout == "sharded":
+            signatures = self.users.signature() + self.notes.owner_signature(username)
+        else:
+            signatures = self.users.signature() + self.notes.signature()
+        mtimes = [s[1] for s in signatures if s is not None]
+        return repr(signatures), max(mtimes, default=0) / 1e9
+
+    def compact(self):
+        self.users.compact()
+        self.notes.compact()
+        self.versions.compact()
+
+    def save_index_cache(self):
+        self.notes.save_index_cache()
+
+    def preload(self):
+        self.users.refresh()
+        self.versions.refresh()
+        if self.layout == "sharded":
+            self.notes.manifest.refresh()  # shards still load on a user's first request
+        else:
+            self.notes.refresh()
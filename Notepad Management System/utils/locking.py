@@ -0,0 +1,66 @@
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+class InterProcessLock:
+    """Re-entrant exclusive lock shared by every thread and worker process.
+
+    Threads in one process serialize on an RLock; processes serialize on an
+    fcntl advisory lock held on ``<path>.lock``. Only the outermost acquire
+    touches the file lock, so nested use (e.g. a write inside a batch) is safe.
+    """
+
+    def __init__(self, path: str):
+        self.path = path + ".lock"
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._rlock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._rlock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def atomic_write(path: str, write, binary: bool = False):
+    """Call ``write(f)`` on a temp file next to ``path`` and swap it in.
+
+    Readers see either the old file or the new one, never a truncated one.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb" if binary else "w") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,267 @@
+import cProfile
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+
+from flask import Response, before_render_template, g, request, template_rendered
+
+# seconds; the same buckets serve request, storage I/O and render histograms
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+_lock = threading.Lock()
+_enabled = False
+# stats for the request being handled on this thread/context, if any
+_current = contextvars.ContextVar("notepad_request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, n in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += n
+            yield f"{name}_bucket{_labels(labels, le=bound)} {cumulative}"
+        yield f"{name}_sum{_labels(labels)} {self.sum}"
+        yield f"{name}_count{_labels(labels)} {self.count}"
+
+
+class RequestStats:
+    """What one request spent, for Server-Timing and the per-request histograms."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.storage_calls = 0
+        self.io = {}  # op -> [calls, seconds, bytes]
+        self.render_seconds = 0.0
+        self.render_stack = []
+
+
+# metric name -> {label tuple: Histogram or number}
+_histograms = {}
+_counters = {}
+
+HELP = {
+    "notepad_request_duration_seconds": "Request latency by endpoint.",
+    "notepad_request_storage_calls": "Storage backend calls made per request.",
+    "notepad_json_io_seconds": "Time spent in read_json/write_json.",
+    "notepad_template_render_seconds": "Jinja render time by template.",
+    "notepad_storage_calls_total": "Storage backend calls by method.",
+    "notepad_json_io_bytes_total": "Bytes parsed by read_json / written by write_json.",
+}
+
+
+def _labels(labels, **extra):
+    items = list(labels) + [(k, v) for k, v in extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _observe(name, labels, value, buckets=BUCKETS):
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        hist = series.get(labels)
+        if hist is None:
+            hist = series[labels] = Histogram(buckets)
+        hist.observe(value)
+
+
+def _count(name, labels, amount=1):
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + amount
+
+
+def enabled():
+    return _enabled
+
+
+# ---------- hooks called from utils.storage ----------
+def record_io(op, seconds, size):
+    """Account one read_json/write_json call; a no-op unless metrics are on."""
+    if not _enabled:
+        return
+    labels = (("op", op),)
+    _observe("notepad_json_io_seconds", labels, seconds)
+    _count("notepad_json_io_bytes_total", labels, size)
+    stats = _current.get()
+    if stats is not None:
+        entry = stats.io.setdefault(op, [0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += size
+
+
+class CountingBackend:
+    """Wraps a storage backend and counts calls per method (and per request)."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def __getattr__(self, name):
+        attr = getattr(self._backend, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+
+        def counted(*args, **kwargs):
+            _count("notepad_storage_calls_total", (("call", name),))
+            stats = _current.get()
+            if stats is not None:
+                stats.storage_calls += 1
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+# ---------- Flask wiring ----------
+def init_app(app):
+    """Turn on instrumentation for ``app`` and expose /metrics.
+
+    Config:
+      METRICS_SERVER_TIMING  add a Server-Timing header to every response
+      METRICS_PROFILE_SAMPLE fraction of requests run under cProfile (0 = off)
+      METRICS_SLOW_MS        sampled requests slower than this are dumped
+      METRICS_PROFILE_DIR    where the .prof files go
+    """
+    global _enabled
+    _enabled = True
+    server_timing = app.config.get("METRICS_SERVER_TIMING", False)
+    sample = float(app.config.get("METRICS_PROFILE_SAMPLE", 0))
+    slow_seconds = float(app.config.get("METRICS_SLOW_MS", 500)) / 1000
+    profile_dir = app.config.get("METRICS_PROFILE_DIR") or "profiles"
+    profile_lock = threading.Lock()
+
+    @app.before_request
+    def start_request():
+        g.metrics_stats = RequestStats()
+        g.metrics_token = _current.set(g.metrics_stats)
+        g.metrics_profiler = None
+        # one profiled request at a time; cProfile can't nest
+        if sample and random.random() < sample and profile_lock.acquire(blocking=False):
+            g.metrics_profiler = cProfile.Profile()
+            g.metrics_profiler.enable()
+
+    @app.after_request
+    def finish_request(response):
+        stats = getattr(g, "metrics_stats", None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or "unmatched"
+        _observe("notepad_request_duration_seconds",
+                 (("endpoint", endpoint), ("method", request.method), ("status", response.status_code)), elapsed)
+        _observe("notepad_request_storage_calls", (("endpoint", endpoint),), stats.storage_calls, COUNT_BUCKETS)
+
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            profile_lock.release()
+            if elapsed >= slow_seconds:
+                os.makedirs(profile_dir, exist_ok=True)
+                safe_endpoint = re.sub(r"[^\w.]", "_", endpoint)
+                name = f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_endpoint}-{int(elapsed * 1000)}ms.prof"
+                profiler.dump_stats(os.path.join(profile_dir, name))
+
+        if server_timing:
+            parts = [f"total;dur={elapsed * 1000:.2f}", f'storage;desc="{stats.storage_calls} calls"']
+            for op, (calls, seconds, size) in stats.io.items():
+                parts.append(f'{op};dur={seconds * 1000:.2f};desc="{calls}x {size}B"')
+            if stats.render_seconds:
+                parts.append(f"render;dur={stats.render_seconds * 1000:.2f}")
+            response.headers.add("Server-Timing", ", ".join(parts))
+        return response
+
+    @app.teardown_request
+    def reset_request(exc):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            _current.reset(token)
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is not None:  # request failed before after_request
+            profiler.disable()
+            profile_lock.release()
+
+    def render_started(sender, template, context, **extra):
+        stats = _current.get()
+        if stats is not None:
+            stats.render_stack.append(time.perf_counter())
+
+    def render_finished(sender, template, context, **extra):
+        stats = _current.get()
+        if stats is not None and stats.render_stack:
+            seconds = time.perf_counter() - stats.render_stack.pop()
+            if not stats.render_stack:
+                stats.render_seconds += seconds
+            _observe("notepad_template_render_seconds", (("template", template.name),), seconds)
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+
+
+def _gauges():
+    """Point-in-time values from other subsystems."""
+    from utils import fragment_cache, hashing, warmup
+
+    pool = hashing.hash_pool.stats()
+    yield "notepad_hash_pool_in_flight", "Password hashes queued or running.", pool["in_flight"]
+    yield "notepad_hash_pool_rejected_total", "Logins shed because the hash queue was full.", pool["rejected"]
+    cache = fragment_cache.fragment_cache.stats()
+    yield "notepad_fragment_cache_bytes", "Bytes held by the fragment cache.", cache["bytes"]
+    yield "notepad_fragment_cache_hits_total", "Fragment cache hits.", cache["hits"]
+    yield "notepad_fragment_cache_misses_total", "Fragment cache misses.", cache["misses"]
+    if warmup.boot_stats["boot_seconds"] is not None:
+        yield "notepad_boot_seconds", "Time create_app() took in this worker.", warmup.boot_stats["boot_seconds"]
+    if warmup.boot_stats["first_request_seconds"] is not None:
+        yield ("notepad_first_request_seconds", "Time this worker took to serve its first request.",
+               warmup.boot_stats["first_request_seconds"])
+
+
+def render_metrics():
+    """Everything recorded so far in the Prometheus text format."""
+    lines = []
+    with _lock:
+        for name, series in sorted(_histograms.items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in sorted(series.items()):
+                lines.extend(hist.lines(name, labels))
+        for name, series in sorted(_counters.items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(labels)} {value}")
+    for name, help_text, value in _gauges():
+        kind = "counter" if name.endswith("_total") else "gauge"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
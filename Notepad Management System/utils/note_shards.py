@@ -0,0 +1,301 @@
+import hashlib
+import os
+import re
+import threading
+from contextlib import ExitStack, contextmanager
+
+from utils.journal import Journal, journal_path
+from utils.locking import InterProcessLock, atomic_write
+from utils.note_store import NoteStore
+from utils.pagination import PAGE_SIZE
+
+MANIFEST_NAME = "manifest.json"
+BLOCK_SIZE = 1024
+
+
+def shard_filename(owner):
+    """Readable, collision-free file name for an owner's shard."""
+    slug = re.sub(r"[^A-Za-z0-9_-]", "_", owner or "")[:40]
+    return f"{slug}-{hashlib.sha1((owner or '').encode('utf-8')).hexdigest()[:8]}.json"
+
+
+class NoteManifest:
+    """data/notes/manifest.json: which owner each note id belongs to.
+
+    Ids are handed out in blocks of ``block_size``; an owner allocates
+    inside its latest block and only takes a new one (rewriting this file)
+    when it runs out. Ids that predate sharding are listed per owner under
+    "legacy". So the manifest stays small, is rarely written, and maps any
+    id to its shard without a global index of notes.
+    """
+
+    def __init__(self, path, load, dump):
+        self.path = path
+        self._load = load
+        self._dump = dump
+        self._lock = threading.RLock()
+        self._write_lock = InterProcessLock(path)
+        self._signature = None
+        self._reset({"block_size": BLOCK_SIZE, "next_block": 0, "blocks": {}, "legacy": {}})
+
+    def _reset(self, data):
+        self.block_size = data["block_size"]
+        self._next_block = data["next_block"]
+        self._owner_blocks = {owner: list(blocks) for owner, blocks in data["blocks"].items()}
+        self._legacy_ids = {owner: list(ids) for owner, ids in data["legacy"].items()}
+        self._block_owner = {b: owner for owner, blocks in self._owner_blocks.items() for b in blocks}
+        self._legacy_owner = {i: owner for owner, ids in self._legacy_ids.items() for i in ids}
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def refresh(self):
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+            if signature != self._signature:
+                self._reset(self._load(self.path))
+                self._signature = signature
+
+    def _save(self):
+        self._dump(self.path, {
+            "block_size": self.block_size,
+            "next_block": self._next_block,
+            "blocks": self._owner_blocks,
+            "legacy": self._legacy_ids,
+        })
+        st = os.stat(self.path)
+        self._signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def owners(self):
+        with self._lock:
+            self.refresh()
+            return set(self._owner_blocks) | set(self._legacy_ids)
+
+    def owner_of(self, note_id):
+        with self._lock:
+            self.refresh()
+            owner = self._legacy_owner.get(note_id)
+            if owner is None:
+                owner = self._block_owner.get(note_id // self.block_size)
+            return owner
+
+    def allocate(self, owner, after):
+        """Next id for ``owner`` above ``after`` (the highest id in its shard)."""
+        with self._lock:
+            self.refresh()
+            blocks = self._owner_blocks.get(owner)
+            if blocks:
+                candidate = max(after + 1, blocks[-1] * self.block_size)
+                if candidate < (blocks[-1] + 1) * self.block_size:
+                    return candidate
+        with self._write_lock, self._lock:
+            self.refresh()
+            block = self._next_block
+            self._next_block += 1
+            self._owner_blocks.setdefault(owner, []).append(block)
+            self._block_owner[block] = owner
+            self._save()
+            return max(after + 1, block * self.block_size)
+
+    def claim(self, note_id, owner):
+        """Record that an explicitly chosen ``note_id`` belongs to ``owner``."""
+        if self.owner_of(note_id) == owner:
+            return
+        with self._write_lock, self._lock:
+            self.refresh()
+            previous = self._legacy_owner.get(note_id)
+            if previous is not None:
+                self._legacy_ids[previous].remove(note_id)
+            self._legacy_ids.setdefault(owner, []).append(note_id)
+            self._legacy_owner[note_id] = owner
+            self._next_block = max(self._next_block, note_id // self.block_size + 1)
+            self._save()
+
+    def rebuild(self, notes):
+        """Start over from ``notes`` (all of them), as after a migration."""
+        with self._write_lock, self._lock:
+            legacy = {}
+            max_id = 0
+            for note in notes:
+                legacy.setdefault(note.get("owner"), []).append(note["id"])
+                max_id = max(max_id, note["id"])
+            self._reset({"block_size": BLOCK_SIZE, "next_block": max_id // BLOCK_SIZE + 1,
+                         "blocks": {}, "legacy": legacy})
+            self._save()
+
+
+class ShardedNoteStore:
+    """Notes split into one NoteStore file per owner under ``directory``.
+
+    A user's pages, searches and writes load and lock only that user's
+    shard, so writers for different users never contend and no request
+    pays for the size of the whole user base. Lookups by id go through the
+    manifest. Shards are opened lazily and kept resident like notes.json is.
+    """
+
+    def __init__(self, directory, load, dump, mode="snapshot", compact_threshold=500, migrate_from=None):
+        self.directory = directory
+        self._load = load
+        self._dump = dump
+        self._journaled = mode == "journal"
+        self.compact_threshold = compact_threshold
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = NoteManifest(os.path.join(directory, MANIFEST_NAME), load, dump)
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()  # this thread's open batch, if any
+        if migrate_from and not self.manifest.exists():
+            split_notes_file(migrate_from, self)
+
+    # ---------- shards ----------
+    def _create_empty(self, path):
+        # link() refuses to overwrite, so a shard another worker just wrote survives
+        tmp = path + f".new-{os.getpid()}-{threading.get_ident()}"
+        atomic_write(tmp, lambda f: f.write('{"notes": []}'))
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+
+    def shard(self, owner):
+        store = self._shards.get(owner)
+        if store is None:
+            with self._lock:
+                store = self._shards.get(owner)
+                if store is None:
+                    path = os.path.join(self.directory, shard_filename(owner))
+                    if not os.path.exists(path):
+                        self._create_empty(path)
+                    store = NoteStore(path, load=self._load, dump=self._dump,
+                                      journal=Journal(journal_path(path)) if self._journaled else None,
+                                      compact_threshold=self.compact_threshold,
+                                      index_path=os.path.splitext(path)[0] + ".index.pickle")
+                    self._shards[owner] = store
+        batch = getattr(self._local, "batch", None)
+        if batch is not None:
+            batch.enter(store)
+        return store
+
+    def _shard_of(self, note_id):
+        owner = self.manifest.owner_of(note_id)
+        return None if owner is None else self.shard(owner)
+
+    # ---------- reads ----------
+    def all(self):
+        notes = [n for owner in self.manifest.owners() for n in self.shard(owner).all()]
+        return sorted(notes, key=lambda n: n["id"])
+
+    def get(self, note_id):
+        store = self._shard_of(note_id)
+        return store.get(note_id) if store is not None else None
+
+    def by_owner(self, owner, status=None):
+        return self.shard(owner).by_owner(owner, status)
+
+    def iter_owner(self, owner, status=None, chunk_size=500):
+        return self.shard(owner).iter_owner(owner, status, chunk_size)
+
+    def page(self, owner, status, sort_by, cursor=None, limit=PAGE_SIZE):
+        return self.shard(owner).page(owner, status, sort_by, cursor, limit)
+
+    def search(self, owner, query, status=None, limit=50):
+        return self.shard(owner).search(owner, query, status, limit)
+
+    def owner_signature(self, owner):
+        return self.shard(owner).signature()
+
+    # ---------- writes ----------
+    def insert_new(self, note):
+        owner = note.get("owner")
+        return self.shard(owner).insert_new(note, allocate=lambda after: self.manifest.allocate(owner, after))
+
+    def insert(self, note):
+        owner = note.get("owner")
+        previous = self.manifest.owner_of(note["id"])
+        if previous is not None and previous != owner:
+            self.shard(previous).delete(note["id"])
+        self.manifest.claim(note["id"], owner)
+        return self.shard(owner).insert(note)
+
+    def update(self, note_id, fields):
+        store = self._shard_of(note_id)
+        return store.update(note_id, fields) if store is not None else False
+
+    def delete(self, note_id):
+        store = self._shard_of(note_id)
+        return store.delete(note_id) if store is not None else False
+
+    def replace_all(self, notes):
+        groups = {}
+        for note in notes:
+            groups.setdefault(note.get("owner"), []).append(note)
+        for owner in self.manifest.owners() - set(groups):
+            self.shard(owner).replace_all([])
+        for owner, group in groups.items():
+            self.shard(owner).replace_all(group)
+        self.manifest.rebuild(notes)
+        return True
+
+    @contextmanager
+    def batch(self):
+        """Batch each shard touched inside; each one is written once at the end.
+
+        Meant for one owner's notes (imports, bulk actions): shards are
+        locked in the order they are first touched.
+        """
+        if getattr(self._local, "batch", None) is not None:
+            yield self
+            return
+        with ExitStack() as stack:
+            self._local.batch = _ShardBatch(stack)
+            try:
+                yield self
+            finally:
+                self._local.batch = None
+
+    def compact(self):
+        for store in list(self._shards.values()):
+            store.compact()
+
+    def save_index_cache(self):
+        for store in list(self._shards.values()):
+            store.save_index_cache()
+
+
+class _ShardBatch:
+    def __init__(self, stack):
+        self.stack = stack
+        self.entered = set()
+
+    def enter(self, store):
+        if id(store) not in self.entered:
+            self.entered.add(id(store))
+            self.stack.enter_context(store.batch())
+
+
+def split_notes_file(notes_file, store):
+    """Migration: copy a single notes.json into ``store``'s shards.
+
+    The manifest is written last and its existence marks the migration as
+    done. notes.json itself is left in place as a backup.
+    """
+    with store.manifest._write_lock:
+        if store.manifest.exists():
+            return 0
+        try:
+            notes = store._load(notes_file)["notes"]
+        except FileNotFoundError:
+            notes = []
+        groups = {}
+        for note in notes:
+            groups.setdefault(note.get("owner"), []).append(note)
+        for owner, group in groups.items():
+            store._dump(os.path.join(store.directory, shard_filename(owner)), {"notes": group})
+        store.manifest.rebuild(notes)
+        return len(notes)
@@ -0,0 +1,178 @@
+import gc
+import os
+import pickle
+
+from utils.locking import atomic_write
+from utils.pagination import PAGE_SIZE, slice_keys, sort_mode
+from utils.record_store import RecordStore
+from utils.search_index import SearchIndex
+from utils.sort_index import SortIndex
+
+# bump when the pickled layout of NoteStore's indexes changes
+INDEX_CACHE_VERSION = 1
+
+
+class NoteStore(RecordStore):
+    """Resident notes.json with indexes by id, owner and (owner, status).
+
+    Each (owner, status) bucket also keeps a SortIndex, so every /home sort
+    mode is served from a maintained ordering, and every note is fed to a
+    SearchIndex. Both are updated from the same _index/_unindex hooks as the
+    other indexes, so every mutation path keeps them current.
+
+    The records and all of these indexes are pickled to ``index_path`` at
+    exit (and on compaction) together with the file signature they match.
+    A worker starting against unchanged files loads that one file instead
+    of parsing the JSON, re-tokenizing every note and re-sorting. It's a
+    cache the app writes into its own data directory; a mismatched or
+    unreadable one is ignored.
+    """
+
+    collection = "notes"
+    key = "id"
+
+    def __init__(self, *args, index_path=None, **kwargs):
+        self.index_path = index_path
+        self._index_cache_tried = False
+        self._index_cache_signature = None  # what the file on disk matches
+        super().__init__(*args, **kwargs)
+
+    def _reset_indexes(self):
+        self._by_owner = {}
+        self._by_owner_status = {}
+        self._sorted = SortIndex()
+        self._search = SearchIndex()
+        self._max_id = 0
+
+    def _begin_rebuild(self):
+        self._sorted.begin_bulk()
+        self._search.begin_bulk()
+
+    def _end_rebuild(self):
+        self._sorted.end_bulk()
+        self._search.end_bulk()
+
+    def _restore(self, signature):
+        # only on the first load: later reloads follow another process's write
+        if not self.index_path or self._index_cache_tried:
+            return False
+        self._index_cache_tried = True
+        # the collector would walk the half-built graph over and over while it loads
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(self.index_path, "rb") as f:
+                if pickle.load(f) != (INDEX_CACHE_VERSION, signature):
+                    return False
+                state = pickle.load(f)
+        except Exception:
+            return False  # missing, torn, or from an incompatible version: rebuild
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        (self._records, self._by_owner, self._by_owner_status,
+         self._sorted, self._search, self._max_id) = state
+        self._index_cache_signature = signature
+        return True
+
+    def _index(self, note):
+        self._by_owner.setdefault(note.get("owner"), {})[note["id"]] = note
+        key = (note.get("owner"), note.get("status"))
+        self._by_owner_status.setdefault(key, {})[note["id"]] = note
+        self._sorted.add(key, note)
+        self._search.add(note)
+        if note["id"] > self._max_id:
+            self._max_id = note["id"]
+
+    def _unindex(self, note):
+        self._by_owner.get(note.get("owner"), {}).pop(note["id"], None)
+        key = (note.get("owner"), note.get("status"))
+        self._by_owner_status.get(key, {}).pop(note["id"], None)
+        self._sorted.remove(key, note)
+        self._search.remove(note["id"])
+        if note["id"] == self._max_id and note["id"] not in self._records:
+            self._max_id = max(self._records, default=0)
+
+    def by_owner(self, owner, status=None):
+        with self._lock:
+            self.refresh()
+            if status is None:
+                bucket = self._by_owner.get(owner, {})
+            else:
+                bucket = self._by_owner_status.get((owner, status), {})
+            return [dict(n) for n in bucket.values()]
+
+    def iter_owner(self, owner, status=None, chunk_size=500):
+        """Yield copies of an owner's notes in id order, ``chunk_size`` at a time.
+
+        The lock is only held while copying each chunk, so a long export
+        never blocks writers and never materializes the whole collection.
+        """
+        with self._lock:
+            self.refresh()
+            if status is None:
+                ids = sorted(self._by_owner.get(owner, {}))
+            else:
+                ids = sorted(self._by_owner_status.get((owner, status), {}))
+        for start in range(0, len(ids), chunk_size):
+            with self._lock:
+                self.refresh()
+                chunk = [dict(self._records[i]) for i in ids[start:start + chunk_size] if i in self._records]
+            yield from chunk
+
+    def page(self, owner, status, sort_by, cursor=None, limit=PAGE_SIZE):
+        """One page of an owner's notes in ``sort_by`` order, plus the next cursor."""
+        with self._lock:
+            self.refresh()
+            keys = self._sorted.keys((owner, status), sort_mode(sort_by)[0])
+            page_keys, next_cursor = slice_keys(keys, sort_by, cursor, limit)
+            return [dict(self._records[k[-1]]) for k in page_keys], next_cursor
+
+    def search(self, owner, query, status=None, limit=50):
+        with self._lock:
+            self.refresh()
+            return [dict(self._records[i]) for i in self._search.search(owner, query, status, limit)]
+
+    def save_index_cache(self):
+        """Pickle the records and indexes for the next worker to start from."""
+        if not self.index_path or self._signature in (None, self._index_cache_signature):
+            return  # nothing loaded, or the cache is already current
+        if not os.path.exists(self.path):
+            return  # the data itself is gone (e.g. a scratch directory was removed)
+        # the write lock keeps out a write whose memory update is done but whose file isn't
+        with self._write_lock, self._lock:
+            if self._signature in (None, self._index_cache_signature) or self._batch_depth:
+                return
+            header = (INDEX_CACHE_VERSION, self._signature)
+            state = (self._records, self._by_owner, self._by_owner_status,
+                     self._sorted, self._search, self._max_id)
+
+            def dump(f):
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            atomic_write(self.index_path, dump, binary=True)
+            self._index_cache_signature = self._signature
+
+    def compact(self):
+        super().compact()
+        self.save_index_cache()
+
+    def next_id(self):
+        with self._lock:
+            self.refresh()
+            return self._max_id + 1
+
+    def insert_new(self, note, allocate=None):
+        """Insert ``note`` under a freshly allocated id and return that id.
+
+        Allocation and insert happen under the same write lock, so two
+        workers can never hand out the same id. ``allocate(max_id)``, if
+        given, picks the id instead of ``max_id + 1`` (sharded layout).
+        """
+        with self._write_lock:
+            with self._lock:
+                self.refresh()
+                note = dict(note, id=self._max_id + 1 if allocate is None else allocate(self._max_id))
+            self.insert(note)
+            return note["id"]
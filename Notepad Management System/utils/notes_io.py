@@ -0,0 +1,238 @@
+import io
+import json
+import re
+import zipfile
+from datetime import datetime, timezone
+
+from utils.storage import add_note, batch_writes
+
+EXPORT_FIELDS = ("id", "title", "content", "status", "created_at", "updated_at")
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "zip": ("application/zip", "zip"),
+}
+EXPORT_CHUNK_BYTES = 64 * 1024
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_ERRORS = 20
+MAX_MARKDOWN_BYTES = 1024 * 1024
+
+
+class InvalidRecord(ValueError):
+    """An imported record that can't be turned into a note."""
+
+
+# ---------- export ----------
+def export_ndjson(notes):
+    """Stream ``notes`` as NDJSON, one note per line, in ~64 KB chunks."""
+    buf, size = [], 0
+    for note in notes:
+        line = json.dumps({k: note.get(k) for k in EXPORT_FIELDS}, ensure_ascii=False) + "\n"
+        buf.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf)
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable target for ZipFile; drained after every member.
+
+    Because it can't seek, ZipFile writes each member with a data descriptor
+    instead of going back to patch the local header, which is what lets the
+    archive be streamed out as it is built.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _slug(title):
+    return re.sub(r"[^\w-]+", "-", title.casefold()).strip("-")[:60] or "note"
+
+
+def note_to_markdown(note):
+    front = [
+        "---",
+        f"title: {json.dumps(note.get('title') or '', ensure_ascii=False)}",
+        f"status: {note.get('status') or 'active'}",
+        f"created_at: {note.get('created_at') or ''}",
+        f"updated_at: {note.get('updated_at') or ''}",
+        "---",
+        "",
+    ]
+    return "\n".join(front) + "\n" + (note.get("content") or "")
+
+
+def export_markdown_zip(notes):
+    """Stream ``notes`` as a zip with one Markdown file (front matter + body) each."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for note in notes:
+            zf.writestr(f"{note['id']:06d}-{_slug(note.get('title') or '')}.md",
+                        note_to_markdown(note).encode("utf-8"))
+            yield sink.drain()
+    yield sink.drain()
+
+
+# ---------- import ----------
+def parse_ndjson(stream):
+    """Yield ``(where, record)`` for each non-blank line of a binary stream.
+
+    Lines are read one at a time, so the upload is never held in memory as a
+    whole. Lines that aren't JSON come through as an InvalidRecord.
+    """
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield f"line {line_no}", json.loads(line)
+        except ValueError:
+            yield f"line {line_no}", InvalidRecord("not valid JSON")
+
+
+def markdown_to_note(text):
+    record = {}
+    body = text
+    if text.startswith("---\n"):
+        end = text.find("\n---\n", 3)
+        if end == -1:
+            raise InvalidRecord("unterminated front matter")
+        for line in text[4:end].splitlines():
+            key, sep, value = line.partition(":")
+            if sep:
+                record[key.strip()] = value.strip()
+        body = text[end + 5:]
+        if body.startswith("\n"):
+            body = body[1:]
+    title = record.get("title", "")
+    if title.startswith('"'):
+        try:
+            title = json.loads(title)
+        except ValueError:
+            raise InvalidRecord("bad title in front matter") from None
+    if not title and body.startswith("# "):
+        # plain Markdown without front matter: the first heading is the title
+        title, _, body = body[2:].partition("\n")
+    record["title"] = title
+    record["content"] = body
+    for key in ("created_at", "updated_at"):
+        if not record.get(key):
+            record.pop(key, None)
+    return record
+
+
+def parse_markdown_zip(stream):
+    """Yield ``(where, record)`` for each ``.md`` member of a zip upload."""
+    try:
+        zf = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        yield "upload", InvalidRecord("not a zip file")
+        return
+    with zf:
+        for info in zf.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(".md"):
+                continue
+            if info.file_size > MAX_MARKDOWN_BYTES:
+                yield info.filename, InvalidRecord("file too large")
+                continue
+            try:
+                yield info.filename, markdown_to_note(zf.read(info).decode("utf-8").replace("\r\n", "\n"))
+            except UnicodeDecodeError:
+                yield info.filename, InvalidRecord("not UTF-8 text")
+            except InvalidRecord as e:
+                yield info.filename, e
+
+
+def _timestamp(value, field):
+    if value in (None, ""):
+        return None
+    if not isinstance(value, str):
+        raise InvalidRecord(f"{field} must be an ISO timestamp")
+    try:
+        # "Z" isn't accepted by fromisoformat() before Python 3.11
+        dt = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith(("Z", "z")) else value)
+    except ValueError:
+        raise InvalidRecord(f"{field} must be an ISO timestamp") from None
+    if dt.tzinfo is not None:
+        # stored timestamps are naive UTC; an aware one wouldn't sort against them
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+
+def validate_record(record):
+    """Turn an imported record into note fields (without id/owner).
+
+    Same rules as the note form: a non-empty title is required. Ids and
+    owners in the file are ignored; imported notes always get fresh ids and
+    belong to the importing user.
+    """
+    if isinstance(record, InvalidRecord):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRecord("expected a JSON object")
+    title = record.get("title")
+    if not isinstance(title, str) or not title.strip():
+        raise InvalidRecord("title is required")
+    content = record.get("content") or ""
+    if not isinstance(content, str):
+        raise InvalidRecord("content must be a string")
+    status = record.get("status") or "active"
+    if status not in ("active", "archived"):
+        raise InvalidRecord("status must be 'active' or 'archived'")
+    return {
+        "title": title.strip(),
+        "content": content.strip(),
+        "status": status,
+        "created_at": _timestamp(record.get("created_at"), "created_at") or datetime.utcnow().isoformat(),
+        "updated_at": _timestamp(record.get("updated_at"), "updated_at"),
+    }
+
+
+def _commit(notes):
+    with batch_writes():
+        for note in notes:
+            add_note(note)
+
+
+def import_notes(owner, entries, batch_size=IMPORT_BATCH_SIZE):
+    """Validate ``(where, record)`` pairs and store them for ``owner``.
+
+    Valid notes are committed ``batch_size`` at a time inside batch_writes(),
+    i.e. one storage write per batch rather than one per note. Returns
+    ``(imported, skipped, errors)``; errors holds the first few
+    ``"where: reason"`` messages.
+    """
+    imported = skipped = 0
+    errors = []
+    pending = []
+    for where, record in entries:
+        try:
+            note = validate_record(record)
+        except InvalidRecord as e:
+            skipped += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append(f"{where}: {e}")
+            continue
+        pending.append(dict(note, id=None, owner=owner))
+        if len(pending) >= batch_size:
+            _commit(pending)
+            imported += len(pending)
+            pending = []
+    if pending:
+        _commit(pending)
+        imported += len(pending)
+    return imported, skipped, errors
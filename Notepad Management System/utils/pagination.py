@@ -0,0 +1,83 @@
+import base64
+import json
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+def _parse(ts):
+    return datetime.fromisoformat(ts) if ts else datetime.min
+
+
+# Sort keys. The note id is the tiebreaker so every key is unique and a
+# cursor always points at exactly one position.
+SORT_KEYS = {
+    "created": lambda n: (_parse(n.get("created_at")), n["id"]),
+    "title": lambda n: (n["title"].casefold(), n["id"]),
+    "updated": lambda n: (_parse(n.get("updated_at") or n.get("created_at")), n["id"]),
+}
+
+# sort_by -> (sort key, descending?)
+SORTS = {
+    "date_desc": ("created", True),
+    "date_asc": ("created", False),
+    "title_asc": ("title", False),
+    "title_desc": ("title", True),
+    "updated_desc": ("updated", True),
+}
+DEFAULT_SORT = "date_desc"
+
+
+def sort_mode(sort_by):
+    return SORTS.get(sort_by, SORTS[DEFAULT_SORT])
+
+
+def encode_cursor(key) -> str:
+    value, note_id = key
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, note_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key_name: str):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, note_id = json.loads(raw)
+        if not isinstance(value, str) or not isinstance(note_id, int):
+            return None
+        if key_name != "title":
+            value = datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        return None
+    return (value, note_id)
+
+
+def slice_keys(keys, sort_by, cursor=None, limit=PAGE_SIZE):
+    """Pick one page out of ascending ``keys``; return ``(page_keys, next_cursor)``.
+
+    Keyset pagination: the cursor is the sort key of the last note on the
+    previous page, so pages stay stable while notes are added or removed.
+    """
+    key_name, descending = sort_mode(sort_by)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor, key_name)
+
+    if descending:
+        end = bisect_left(keys, after) if after is not None else len(keys)
+        start = max(0, end - limit)
+        page = keys[start:end][::-1]
+        has_more = start > 0
+    else:
+        start = bisect_right(keys, after) if after is not None else 0
+        end = start + limit
+        page = keys[start:end]
+        has_more = end < len(keys)
+
+    next_cursor = encode_cursor(page[-1]) if has_more and page else None
+    return page, next_cursor
+
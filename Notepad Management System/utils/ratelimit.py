@@ -0,0 +1,206 @@
+import math
+import os
+import threading
+import time
+
+from utils.sqlite_util import make_store, thread_connection
+
+# name -> (max events, window seconds); override with RATE_LIMIT_<NAME>="count/seconds"
+DEFAULT_LIMITS = {
+    "login_ip": (30, 60),          # every login attempt from one address
+    "login_user": (5, 300),        # failed logins against one username/email
+    "register_ip": (10, 3600),
+    "otp_request_ip": (5, 600),
+    "otp_request_user": (3, 600),
+    "otp_verify": (10, 600),       # guesses at one 6-digit code
+}
+SWEEP_EVERY = 1000
+
+
+class RateLimited(Exception):
+    """Raised when a limit is exceeded; the app answers 429 + Retry-After."""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Too many requests.")
+        self.retry_after = retry_after
+
+
+def _estimate(window, count, prev, now, seconds):
+    """Sliding-window estimate from two fixed windows.
+
+    The previous window's count is weighted by how much of it still
+    overlaps the sliding window ending now. Each key costs two integers,
+    not a timestamp per event.
+    """
+    current = int(now // seconds)
+    if window == current:
+        cur, last = count, prev
+    elif window == current - 1:
+        cur, last = 0, count
+    else:
+        cur, last = 0, 0
+    elapsed = now - current * seconds
+    return cur, last, cur + last * (1 - elapsed / seconds), current
+
+
+def _retry_after(cur, last, limit, now, current, seconds):
+    window_end = (current + 1) * seconds
+    if cur + 1 > limit or not last:
+        return max(1, math.ceil(window_end - now))
+    # when the previous window's weighted share has decayed enough
+    fraction = 1 - (limit - 1 - cur) / last
+    return max(1, math.ceil(current * seconds + fraction * seconds - now))
+
+
+class MemoryCounterStore:
+    """In-process counters; for a single worker (or as a per-worker stand-in)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # key -> (window, count, prev, seconds)
+        self._ops = 0
+
+    def peek(self, key, seconds, now):
+        window, count, prev, _ = self._counters.get(key, (0, 0, 0, seconds))
+        return _estimate(window, count, prev, now, seconds)
+
+    def hit(self, key, limit, seconds, now):
+        """Count one event; return 0 if allowed, else seconds to wait."""
+        with self._lock:
+            cur, last, estimate, current = self.peek(key, seconds, now)
+            if estimate + 1 > limit:
+                return _retry_after(cur, last, limit, now, current, seconds)
+            self._counters[key] = (current, cur + 1, last, seconds)
+            self._ops += 1
+            if self._ops % SWEEP_EVERY == 0:
+                self._sweep_locked(now)
+            return 0
+
+    def clear(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+
+    def sweep(self, now):
+        """Drop counters whose windows have fully slid past."""
+        with self._lock:
+            return self._sweep_locked(now)
+
+    def _sweep_locked(self, now):
+        stale = [k for k, (window, _, _, seconds) in self._counters.items()
+                 if window < int(now // seconds) - 1]
+        for k in stale:
+            del self._counters[k]
+        return len(stale)
+
+
+class SqliteCounterStore:
+    """Counters in a SQLite file, shared by every worker process."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rate_limits (
+        key TEXT PRIMARY KEY,
+        window INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        prev INTEGER NOT NULL,
+        expires REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits (expires);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._ops = 0
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _conn(self):
+        return thread_connection(self._local, self.path, isolation_level=None)
+
+    def peek(self, key, seconds, now):
+        row = self._conn().execute("SELECT window, count, prev FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return _estimate(*(row or (0, 0, 0)), now, seconds)
+
+    def hit(self, key, limit, seconds, now):
+        # already over: reject on a plain read, without taking the write lock
+        cur, last, estimate, current = self.peek(key, seconds, now)
+        if estimate + 1 > limit:
+            return _retry_after(cur, last, limit, now, current, seconds)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur, last, estimate, current = self.peek(key, seconds, now)
+            if estimate + 1 > limit:
+                return _retry_after(cur, last, limit, now, current, seconds)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, window, count, prev, expires) VALUES (?, ?, ?, ?, ?)",
+                (key, current, cur + 1, last, (current + 2) * seconds),
+            )
+        finally:
+            conn.execute("COMMIT")
+        self._ops += 1
+        if self._ops % SWEEP_EVERY == 0:
+            self.sweep(now)
+        return 0
+
+    def clear(self, key):
+        self._conn().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    def sweep(self, now):
+        return self._conn().execute("DELETE FROM rate_limits WHERE expires < ?", (now,)).rowcount
+
+
+class RateLimiter:
+    """Named limits over a counter store, keyed by e.g. IP or username.
+
+    Checks are a dict/row lookup and happen before any storage read or
+    password hashing, so a rejected burst costs next to nothing.
+    """
+
+    def __init__(self, store, limits=None):
+        self.store = store
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+
+    def hit(self, name, subject):
+        """Count one event for ``subject``; raise RateLimited if over the limit."""
+        limit, seconds = self.limits[name]
+        wait = self.store.hit(f"{name}:{subject}", limit, seconds, time.time())
+        if wait:
+            raise RateLimited(wait)
+
+    def check(self, name, subject):
+        """Raise RateLimited if ``subject`` is already at the limit, without counting."""
+        limit, seconds = self.limits[name]
+        now = time.time()
+        cur, last, estimate, current = self.store.peek(f"{name}:{subject}", seconds, now)
+        if estimate + 1 > limit:
+            raise RateLimited(_retry_after(cur, last, limit, now, current, seconds))
+
+    def record(self, name, subject):
+        """Count one event without raising (e.g. a failed login)."""
+        try:
+            self.hit(name, subject)
+        except RateLimited:
+            pass
+
+    def reset(self, name, subject):
+        self.store.clear(f"{name}:{subject}")
+
+
+def parse_limit(value):
+    count, _, seconds = value.partition("/")
+    return int(count), int(seconds)
+
+
+limiter = RateLimiter(MemoryCounterStore())
+
+
+def configure(config, data_dir):
+    """Build the limiter from RATE_LIMIT_BACKEND ("sqlite" shares
+    ``<data_dir>/ratelimit.db`` between workers; "memory" is per process)."""
+    global limiter
+    store = make_store(config, "RATE_LIMIT", MemoryCounterStore, SqliteCounterStore,
+                       os.path.join(data_dir, "ratelimit.db"))
+    limits = {name: parse_limit(config[f"RATE_LIMIT_{name.upper()}"])
+              for name in DEFAULT_LIMITS if config.get(f"RATE_LIMIT_{name.upper()}")}
+    limiter = RateLimiter(store, limits)
@@ -0,0 +1,220 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from utils.locking import InterProcessLock
+
+
+class RecordStore:
+    """Resident copy of one JSON collection file (e.g. ``{"notes": [...]}``).
+
+    The file is parsed once and kept in memory keyed by ``key``. Every access
+    does a cheap ``os.stat`` and reloads only when the snapshot (or journal)
+    changed, so writes made by another process are still picked up.
+
+    Without a journal every mutation rewrites the snapshot. With a journal,
+    mutations are appended as ops and folded back into the snapshot once the
+    journal reaches ``compact_threshold`` entries.
+
+    Every mutation runs refresh -> apply -> persist under an exclusive
+    cross-process lock, so concurrent workers never lose each other's updates.
+    The in-memory lock is released before persisting: readers keep being
+    served from memory while a (possibly slow) snapshot rewrite is on disk.
+    Writers always take the cross-process lock first, then the memory lock.
+    """
+
+    collection = None
+    key = None
+
+    def __init__(self, path, load, dump, journal=None, compact_threshold=500):
+        self.path = path
+        self._load = load
+        self._dump = dump
+        self.journal = journal
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._write_lock = InterProcessLock(path)
+        self._signature = None
+        self._records = {}
+        self._batch_depth = 0
+        self._pending = []
+        self._reset_indexes()
+
+    # ---------- index hooks for subclasses ----------
+    def _reset_indexes(self):
+        pass
+
+    def _index(self, record):
+        pass
+
+    def _unindex(self, record):
+        pass
+
+    def _begin_rebuild(self):
+        pass
+
+    def _end_rebuild(self):
+        pass
+
+    def _restore(self, signature):
+        """Adopt a cached copy of the state for ``signature``; True if it did."""
+        return False
+
+    # ---------- loading ----------
+    def _stat_signature(self):
+        paths = [self.path] + ([self.journal.path] if self.journal is not None else [])
+        signature = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                signature.append(None)
+                continue
+            signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def refresh(self):
+        with self._lock:
+            # take the signature *before* reading, so a write that lands while
+            # we load is seen as a change on the next refresh
+            signature = self._stat_signature()
+            if signature != self._signature:
+                if not self._restore(signature):
+                    self._rebuild(self._load(self.path)[self.collection])
+                    if self.journal is not None:
+                        for op in self.journal.entries():
+                            self._apply(op)
+                self._signature = signature
+
+    def signature(self):
+        """``(inode, mtime_ns, size)`` of each backing file (None if missing)
+        as of the records in memory; every process reading the same files
+        gets the same value."""
+        with self._lock:
+            self.refresh()
+            return self._signature
+
+    def _rebuild(self, records):
+        self._records = {}
+        self._reset_indexes()
+        self._begin_rebuild()
+        for r in records:
+            self._records[r[self.key]] = r
+            self._index(r)
+        self._end_rebuild()
+
+    # ---------- mutation ----------
+    def _apply(self, op):
+        kind = op["op"]
+        if kind == "insert":
+            record = dict(op["record"])
+            old = self._records.get(record[self.key])
+            if old is not None:
+                self._unindex(old)
+            self._records[record[self.key]] = record
+            self._index(record)
+        elif kind == "update":
+            record = self._records.get(op["key"])
+            if record is None:
+                return False
+            self._unindex(record)
+            record.update(op["fields"])
+            self._index(record)
+        elif kind == "delete":
+            record = self._records.pop(op["key"], None)
+            if record is None:
+                return False
+            self._unindex(record)
+        elif kind == "replace":
+            self._rebuild([dict(r) for r in op["records"]])
+        return True
+
+    def _persist(self, ops):
+        # called holding only the write lock; other writers are shut out, so
+        # the records can be serialized without the memory lock
+        try:
+            if self.journal is None:
+                with self._lock:
+                    records = list(self._records.values())
+                self._dump(self.path, {self.collection: records})
+            else:
+                self.journal.append_many(ops)
+        except BaseException:
+            with self._lock:
+                self._signature = None  # memory is ahead of disk; reload it
+            raise
+        with self._lock:
+            self._signature = self._stat_signature()
+        if self.journal is not None and len(self.journal) >= self.compact_threshold:
+            self.compact()
+
+    def _mutate(self, op):
+        with self._write_lock:
+            with self._lock:
+                self.refresh()
+                if not self._apply(op):
+                    return False
+                if self._batch_depth:
+                    self._pending.append(op)
+                    return True
+            self._persist([op])
+            return True
+
+    @contextmanager
+    def batch(self):
+        """Hold the write lock and persist every mutation inside in one write."""
+        with self._write_lock:
+            with self._lock:
+                self.refresh()
+                self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                # drop half-applied in-memory changes; reload from disk next time
+                with self._lock:
+                    self._pending = []
+                    self._signature = None
+                raise
+            finally:
+                self._batch_depth -= 1
+            if self._batch_depth == 0 and self._pending:
+                ops, self._pending = self._pending, []
+                self._persist(ops)
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and empty it."""
+        with self._write_lock:
+            if self.journal is None:
+                return
+            with self._lock:
+                self.refresh()
+                records = list(self._records.values())
+            self._dump(self.path, {self.collection: records})
+            self.journal.truncate()
+            with self._lock:
+                self._signature = self._stat_signature()
+
+    # ---------- reads (copies, so callers can't corrupt the indexes) ----------
+    def all(self):
+        with self._lock:
+            self.refresh()
+            return [dict(r) for r in self._records.values()]
+
+    def get(self, key):
+        with self._lock:
+            self.refresh()
+            record = self._records.get(key)
+            return dict(record) if record else None
+
+    # ---------- writes ----------
+    def replace_all(self, records):
+        return self._mutate({"op": "replace", "records": list(records)})
+
+    def insert(self, record):
+        return self._mutate({"op": "insert", "record": dict(record)})
+
+    def update(self, key, fields):
+        return self._mutate({"op": "update", "key": key, "fields": dict(fields)})
+
+    def delete(self, key):
+        return self._mutate({"op": "delete", "key": key})
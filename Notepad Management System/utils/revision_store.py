@@ -0,0 +1,72 @@
+import os
+
+from utils import codec
+from utils.journal import Journal
+from utils.locking import InterProcessLock, atomic_write
+
+
+class FileRevisionStore:
+    """Revision logs for the JSON backend, one ``<note_id>.jsonl`` per note.
+
+    Recording a revision appends one compact line, so the cost of an edit
+    follows the size of its delta rather than the size of the note or of
+    the history. Only pruning rewrites a log.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = None
+
+    def _locked(self):
+        if self._lock is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._lock = InterProcessLock(os.path.join(self.directory, "revisions"))
+        return self._lock
+
+    def _path(self, note_id):
+        return os.path.join(self.directory, f"{int(note_id)}.jsonl")
+
+    def _log(self, note_id):
+        return Journal(self._path(note_id))
+
+    def get(self, note_id):
+        return self._log(note_id).entries()
+
+    def append(self, note_id, records):
+        """Number ``records`` after the note's last revision and append them."""
+        with self._locked():
+            log = self._log(note_id)
+            existing = log.entries()
+            rev = existing[-1]["rev"] if existing else 0
+            numbered = []
+            for record in records:
+                rev += 1
+                numbered.append(dict(record, rev=rev))
+            log.append_many(numbered)
+            return [r["rev"] for r in numbered]
+
+    def replace(self, note_id, records):
+        with self._locked():
+            if not records:
+                self.delete(note_id)
+                return
+
+            def dump(f):
+                for r in records:
+                    f.write(codec.dumps(r) + b"\n")
+
+            atomic_write(self._path(note_id), dump, binary=True)
+
+    def delete(self, note_id):
+        with self._locked():
+            try:
+                os.remove(self._path(note_id))
+            except FileNotFoundError:
+                pass
+
+    def note_ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [int(name[:-6]) for name in names if name.endswith(".jsonl") and name[:-6].isdigit()]
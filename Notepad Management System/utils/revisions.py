@@ -0,0 +1,209 @@
+import difflib
+import hashlib
+import re
+from datetime import datetime, timedelta
+
+from utils import storage
+
+# a full copy at least every this many revisions bounds reconstruction work
+KEYFRAME_INTERVAL = 16
+RETENTION_DAYS = 90
+MAX_REVISIONS = 200
+PRUNE_INTERVAL = 3600
+
+# words with their trailing whitespace; "".join(tokens) == text
+_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text)
+
+
+# ---------- deltas ----------
+def make_delta(old, new):
+    """Word-level delta turning ``old`` into ``new``.
+
+    A list of ops: ``n > 0`` copies n tokens of ``old``, ``n < 0`` skips -n
+    tokens, a string is inserted as-is. Its size follows the edit, not the note.
+    """
+    a, b = _tokens(old), _tokens(new)
+    delta = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            delta.append(i2 - i1)
+            continue
+        if i2 > i1:
+            delta.append(i1 - i2)
+        if j2 > j1:
+            delta.append("".join(b[j1:j2]))
+    return delta
+
+
+def apply_delta(old, delta):
+    tokens = _tokens(old)
+    out = []
+    pos = 0
+    for op in delta:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.extend(tokens[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def delta_size(delta):
+    return sum(len(op) if isinstance(op, str) else 4 for op in delta)
+
+
+# ---------- reconstruction ----------
+def content_at(records, index):
+    """Content of ``records[index]``, replayed from the nearest keyframe before it."""
+    start = index
+    while "full" not in records[start]:
+        start -= 1
+    content = records[start]["full"]
+    for record in records[start + 1:index + 1]:
+        content = apply_delta(content, record["delta"])
+    return content
+
+
+def _index_of(records, rev):
+    for i, record in enumerate(records):
+        if record["rev"] == rev:
+            return i
+    return None
+
+
+def get_revision(note_id, rev):
+    """``{"rev", "title", "content", "created_at"}`` for one revision, or None."""
+    records = storage.get_note_revisions(note_id)
+    i = _index_of(records, rev)
+    if i is None:
+        return None
+    record = records[i]
+    return {"rev": rev, "title": record["title"], "content": content_at(records, i),
+            "created_at": record["created_at"]}
+
+
+def list_revisions(note_id):
+    """Revision summaries, newest first (no content is reconstructed)."""
+    return [{"rev": r["rev"], "title": r["title"], "created_at": r["created_at"], "size": r["size"],
+             "keyframe": "full" in r} for r in reversed(storage.get_note_revisions(note_id))]
+
+
+def diff_revisions(note_id, rev_a, rev_b):
+    """Unified diff lines between two revisions, or None if either is gone."""
+    records = storage.get_note_revisions(note_id)
+    i, j = _index_of(records, rev_a), _index_of(records, rev_b)
+    if i is None or j is None:
+        return None
+    a = [f"# {records[i]['title']}"] + content_at(records, i).splitlines()
+    b = [f"# {records[j]['title']}"] + content_at(records, j).splitlines()
+    return list(difflib.unified_diff(a, b, f"revision {rev_a}", f"revision {rev_b}", lineterm=""))
+
+
+# ---------- recording ----------
+def _keyframe(title, content, created_at):
+    return {"title": title, "created_at": created_at, "size": len(content), "hash": content_hash(content),
+            "full": content}
+
+
+def update_with_revision(note, title, content):
+    """Save a new title/content for ``note`` and record it as a revision.
+
+    The first edit also records the note's prior state as a keyframe, as
+    does any edit finding the latest revision out of step with the note
+    (e.g. it was replaced by an import), so history always replays cleanly.
+
+    The note is re-read and both writes happen inside one batch, i.e.
+    under the note's write lock: a concurrent edit can't slip in between,
+    so the delta is always built against the content it will replay on.
+    On SQLite the two writes are also one transaction.
+    """
+    with storage.batch_writes():
+        note = storage.find_note_by_id(note["id"])
+        if note is None:
+            return False
+        return _record_and_update(note, title, content)
+
+
+def _record_and_update(note, title, content):
+    now = datetime.utcnow().isoformat()
+    old_content = note.get("content") or ""
+    if title == note.get("title") and content == old_content:
+        return False
+    records = storage.get_note_revisions(note["id"])
+    new = []
+    if not records or records[-1]["hash"] != content_hash(old_content):
+        new.append(_keyframe(note.get("title"), old_content,
+                             note.get("updated_at") or note.get("created_at") or now))
+    since_keyframe = 0
+    for record in reversed(records + new):
+        if "full" in record:
+            break
+        since_keyframe += 1
+    delta = make_delta(old_content, content)
+    if since_keyframe + 1 >= KEYFRAME_INTERVAL or delta_size(delta) * 2 > len(content):
+        new.append(_keyframe(title, content, now))
+    else:
+        new.append({"title": title, "created_at": now, "size": len(content), "hash": content_hash(content),
+                    "delta": delta})
+    storage.append_note_revisions(note["id"], new)
+    return storage.update_note(note["id"], {"title": title, "content": content, "updated_at": now})
+
+
+def restore_revision(note, rev):
+    """Make revision ``rev`` the note's current content (itself a new revision)."""
+    revision = get_revision(note["id"], rev)
+    if revision is None:
+        return False
+    update_with_revision(note, revision["title"], revision["content"])
+    return True
+
+
+# ---------- retention ----------
+def prune(records, now=None, retention_days=RETENTION_DAYS, max_revisions=MAX_REVISIONS):
+    """Apply the retention policy to one note's records.
+
+    Keeps revisions younger than ``retention_days``, at most
+    ``max_revisions`` of them, and always the latest. The oldest survivor
+    is rewritten as a keyframe so the rest still replays. Returns the new
+    list, or None if nothing was dropped.
+    """
+    if not records:
+        return None
+    now = now or datetime.utcnow()
+    cutoff = (now - timedelta(days=retention_days)).isoformat()
+    first = max(len(records) - max_revisions, 0)
+    while first < len(records) - 1 and records[first]["created_at"] < cutoff:
+        first += 1
+    if first == 0:
+        return None
+    head = records[first]
+    kept = [_keyframe(head["title"], content_at(records, first), head["created_at"])]
+    kept[0]["rev"] = head["rev"]
+    return kept + records[first + 1:]
+
+
+def prune_all(retention_days=RETENTION_DAYS, max_revisions=MAX_REVISIONS):
+    """Prune every note's history; drops history of notes that no longer exist."""
+    removed = 0
+    for note_id in storage.note_ids_with_revisions():
+        records = storage.get_note_revisions(note_id)
+        if storage.find_note_by_id(note_id) is None:
+            storage.delete_note_revisions(note_id)
+            removed += len(records)
+            continue
+        pruned = prune(records, retention_days=retention_days, max_revisions=max_revisions)
+        if pruned is not None:
+            storage.replace_note_revisions(note_id, pruned)
+            removed += len(records) - len(pruned)
+    return removed
+
@@ -0,0 +1,125 @@
+import math
+import re
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+
+TOKEN_RE = re.compile(r"\w+")
+TITLE_WEIGHT = 2
+RECENCY_HALF_LIFE_DAYS = 30
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").casefold())
+
+
+def _note_ts(note):
+    ts = note.get("updated_at") or note.get("created_at")
+    try:
+        return datetime.fromisoformat(ts).timestamp() if ts else 0.0
+    except ValueError:
+        return 0.0
+
+
+class SearchIndex:
+    """Inverted index over note titles and contents, scoped per owner.
+
+    ``_postings[owner][token]`` maps note id -> term frequency, and
+    ``_vocab[owner]`` is the sorted token list used for prefix lookups.
+    ``_docs`` remembers what was indexed for each note, so removal never
+    needs the old note body.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._vocab = {}
+        self._docs = {}
+        self._bulk = False
+
+    def begin_bulk(self):
+        """Skip keeping vocab sorted until end_bulk(), for full rebuilds."""
+        self._bulk = True
+
+    def end_bulk(self):
+        self._bulk = False
+        for owner, postings in self._postings.items():
+            self._vocab[owner] = sorted(postings)
+
+    def add(self, note):
+        note_id = note["id"]
+        if note_id in self._docs:
+            self.remove(note_id)
+        tf = {}
+        for token in tokenize(note.get("title")):
+            tf[token] = tf.get(token, 0) + TITLE_WEIGHT
+        for token in tokenize(note.get("content")):
+            tf[token] = tf.get(token, 0) + 1
+        owner = note.get("owner")
+        self._docs[note_id] = (owner, note.get("status"), _note_ts(note), tf)
+        postings = self._postings.setdefault(owner, {})
+        vocab = self._vocab.setdefault(owner, [])
+        for token, count in tf.items():
+            if token not in postings:
+                postings[token] = {}
+                if not self._bulk:
+                    insort(vocab, token)
+            postings[token][note_id] = count
+
+    def remove(self, note_id):
+        doc = self._docs.pop(note_id, None)
+        if doc is None:
+            return
+        owner, _, _, tf = doc
+        postings = self._postings.get(owner, {})
+        vocab = self._vocab.get(owner, [])
+        for token in tf:
+            posting = postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(note_id, None)
+            if not posting:
+                del postings[token]
+                i = bisect_left(vocab, token)
+                if i < len(vocab) and vocab[i] == token:
+                    del vocab[i]
+
+    def _expand(self, owner, prefix):
+        vocab = self._vocab.get(owner, [])
+        i = bisect_left(vocab, prefix)
+        while i < len(vocab) and vocab[i].startswith(prefix):
+            yield vocab[i]
+            i += 1
+
+    def search(self, owner, query, status=None, limit=50):
+        """Note ids matching every query term (as a prefix), best first.
+
+        Score is the log-scaled term frequency of the matched tokens, decayed
+        by how long ago the note was last modified.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        postings = self._postings.get(owner, {})
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for token in self._expand(owner, term):
+                for note_id, count in postings[token].items():
+                    term_scores[note_id] = term_scores.get(note_id, 0.0) + 1 + math.log(count)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {i: s + term_scores[i] for i, s in scores.items() if i in term_scores}
+            if not scores:
+                return []
+
+        now = time.time()
+        ranked = []
+        for note_id, score in scores.items():
+            _, note_status, ts, _ = self._docs[note_id]
+            if status is not None and note_status != status:
+                continue
+            age_days = max(0.0, (now - ts) / 86400) if ts else 3650.0
+            ranked.append((score * (0.1 + 0.9 * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)), note_id))
+        ranked.sort(key=lambda r: (-r[0], -r[1]))
+        return [note_id for _, note_id in ranked[:limit]]
@@ -0,0 +1,230 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+
+from utils.sqlite_util import make_store, thread_connection
+
+SESSION_TTL = 7 * 24 * 3600
+REAP_INTERVAL = 60
+
+
+class ServerSession(SecureCookieSession):
+    """Session dict whose contents live server-side under ``sid``."""
+
+    def __init__(self, initial=None, sid=None, expires=0.0):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires = expires
+        self.new = sid is None
+        # the account the session was loaded for; a change means login/logout
+        self.loaded_user = (initial or {}).get("user")
+
+
+# ---------- stores ----------
+class MemorySessionStore:
+    """Sessions in a dict; only for a single worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}  # sid -> (payload, expires, username)
+        self._by_user = {}
+
+    def get(self, sid):
+        record = self._sessions.get(sid)
+        if record is None or record[1] <= time.time():
+            return None
+        return record[0], record[1]
+
+    def save(self, sid, payload, username, expires):
+        with self._lock:
+            self._forget(sid)
+            self._sessions[sid] = (payload, expires, username)
+            if username:
+                self._by_user.setdefault(username, set()).add(sid)
+
+    def _forget(self, sid):
+        old = self._sessions.pop(sid, None)
+        if old is not None and old[2]:
+            sids = self._by_user.get(old[2])
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._by_user[old[2]]
+
+    def delete(self, sid):
+        with self._lock:
+            self._forget(sid)
+
+    def delete_user(self, username):
+        with self._lock:
+            for sid in list(self._by_user.get(username, ())):
+                self._forget(sid)
+
+    def reap(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [sid for sid, (_, expires, _) in self._sessions.items() if expires <= now]
+            for sid in expired:
+                self._forget(sid)
+        return len(expired)
+
+
+class SqliteSessionStore:
+    """Sessions in a SQLite file, shared by every worker process."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        sid TEXT PRIMARY KEY,
+        username TEXT,
+        data TEXT NOT NULL,
+        expires REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_username ON sessions (username);
+    CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _conn(self):
+        return thread_connection(self._local, self.path)
+
+    def get(self, sid):
+        return self._conn().execute(
+            "SELECT data, expires FROM sessions WHERE sid = ? AND expires > ?", (sid, time.time())
+        ).fetchone()
+
+    def save(self, sid, payload, username, expires):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (sid, username, data, expires) VALUES (?, ?, ?, ?)",
+                         (sid, username, payload, expires))
+
+    def delete(self, sid):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def delete_user(self, username):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE username = ?", (username,))
+
+    def reap(self, now=None):
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM sessions WHERE expires <= ?",
+                                (time.time() if now is None else now,)).rowcount
+
+
+# ---------- Flask interface ----------
+class ServerSessionInterface(SessionInterface):
+    """Keeps session data in ``store``; the cookie holds only a random id.
+
+    Nothing is signed or re-sent per request. The cookie is set once, when
+    the id is issued, and the row is rewritten only when the session
+    changed or is past half its TTL (sliding expiry). A background reaper
+    thread deletes expired rows. The id is rotated whenever the logged-in
+    user changes, so a pre-login id can't be fixed onto a victim.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, ttl=SESSION_TTL, reap_interval=REAP_INTERVAL):
+        self.store = store
+        self.ttl = ttl
+        self.reap_interval = reap_interval
+        self._reaper_pid = None
+        self._reaper_lock = threading.Lock()
+
+    def _ensure_reaper(self):
+        # per process: a forked worker doesn't inherit the parent's thread
+        if self._reaper_pid == os.getpid():
+            return
+        with self._reaper_lock:
+            if self._reaper_pid == os.getpid():
+                return
+            self._reaper_pid = os.getpid()
+            threading.Thread(target=self._reap_forever, name="session-reaper", daemon=True).start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.store.reap()
+            except sqlite3.Error:
+                pass  # e.g. database busy; try again next round
+
+    def open_session(self, app, request):
+        self._ensure_reaper()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            record = self.store.get(sid)
+            if record is not None:
+                payload, expires = record
+                return ServerSession(self.serializer.loads(payload), sid=sid, expires=expires)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       partitioned=self.get_cookie_partitioned(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        if session.sid is not None and session.get("user") != session.loaded_user:
+            self.store.delete(session.sid)
+            session.sid = None
+
+        now = time.time()
+        issue = session.sid is None
+        if not (issue or session.modified or session.expires - now < self.ttl / 2):
+            return
+        if issue:
+            session.sid = secrets.token_urlsafe(32)
+        session.expires = now + self.ttl
+        self.store.save(session.sid, self.serializer.dumps(dict(session)), session.get("user"), session.expires)
+        if issue or session.permanent:
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app),
+                                partitioned=self.get_cookie_partitioned(app),
+                                samesite=self.get_cookie_samesite(app))
+
+
+def revoke_user_sessions(app, username):
+    """Log ``username`` out everywhere; a no-op with cookie sessions."""
+    if isinstance(app.session_interface, ServerSessionInterface):
+        app.session_interface.store.delete_user(username)
+
+
+def init_app(app, data_dir):
+    """Install the server-side session interface chosen by SESSION_BACKEND.
+
+    "cookie" keeps Flask's signed-cookie sessions, "memory" is for a single
+    process, and "sqlite" (the default) shares ``<data_dir>/sessions.db``
+    between workers.
+    """
+    if app.config.get("SESSION_BACKEND", "sqlite") == "cookie":
+        return
+    store = make_store(app.config, "SESSION", MemorySessionStore, SqliteSessionStore,
+                       os.path.join(data_dir, "sessions.db"))
+    app.session_interface = ServerSessionInterface(
+        store,
+        ttl=int(app.config.get("SESSION_TTL", SESSION_TTL)),
+        reap_interval=int(app.config.get("SESSION_REAP_INTERVAL", REAP_INTERVAL)),
+    )
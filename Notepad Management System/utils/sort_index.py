@@ -0,0 +1,47 @@
+from bisect import bisect_left, insort
+
+from utils.pagination import SORT_KEYS
+
+
+class SortIndex:
+    """Ascending key lists per bucket, one list per sort key.
+
+    A bucket is e.g. ``(owner, status)``. Keys hold parsed timestamps and the
+    casefolded title, so a page in any sort mode is a bisect plus a slice
+    instead of a parse-and-sort of every note. Insert/remove are O(log k)
+    searches plus a list shift.
+    """
+
+    def __init__(self):
+        self._lists = {}
+        self._bulk = False
+
+    def begin_bulk(self):
+        """Append without ordering until end_bulk() sorts each list once."""
+        self._bulk = True
+
+    def end_bulk(self):
+        self._bulk = False
+        for keys in self._lists.values():
+            keys.sort()
+
+    def add(self, bucket, note):
+        for name, key in SORT_KEYS.items():
+            keys = self._lists.setdefault((bucket, name), [])
+            if self._bulk:
+                keys.append(key(note))
+            else:
+                insort(keys, key(note))
+
+    def remove(self, bucket, note):
+        for name, key in SORT_KEYS.items():
+            keys = self._lists.get((bucket, name))
+            if not keys:
+                continue
+            k = key(note)
+            i = bisect_left(keys, k)
+            if i < len(keys) and keys[i] == k:
+                del keys[i]
+
+    def keys(self, bucket, name):
+        return self._lists.get((bucket, name), [])
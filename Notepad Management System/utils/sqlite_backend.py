@@ -0,0 +1,376 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from utils.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, sort_mode
+from utils.search_index import tokenize
+from utils.sqlite_util import connect_wal
+from utils.user_store import DuplicateUserError
+
+NOTE_COLUMNS = ("id", "owner", "title", "content", "status", "created_at", "updated_at")
+INSERT_NOTE = (
+    f"INSERT OR REPLACE INTO notes ({', '.join(NOTE_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in NOTE_COLUMNS)})"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (lower(email));
+
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'active',
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_notes_owner_status ON notes (owner, status, created_at, updated_at);
+-- keyset pages (see PAGE_SORT_KEYS); the expressions must match those exactly
+CREATE INDEX IF NOT EXISTS idx_notes_page_created
+    ON notes (owner, status, coalesce(created_at, '0001-01-01T00:00:00'), id);
+CREATE INDEX IF NOT EXISTS idx_notes_page_updated
+    ON notes (owner, status, coalesce(updated_at, created_at, '0001-01-01T00:00:00'), id);
+
+-- per-user change counters for conditional GETs, shared by every worker;
+-- modified is the unix time of the last change
+CREATE TABLE IF NOT EXISTS user_versions (
+    username TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    modified REAL NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS notes_version_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO user_versions VALUES (new.owner, 1, (julianday('now') - 2440587.5) * 86400.0)
+        ON CONFLICT (username) DO UPDATE SET version = version + 1, modified = excluded.modified;
+END;
+CREATE TRIGGER IF NOT EXISTS notes_version_update AFTER UPDATE ON notes BEGIN
+    INSERT INTO user_versions VALUES (new.owner, 1, (julianday('now') - 2440587.5) * 86400.0)
+        ON CONFLICT (username) DO UPDATE SET version = version + 1, modified = excluded.modified;
+END;
+CREATE TRIGGER IF NOT EXISTS notes_version_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO user_versions VALUES (old.owner, 1, (julianday('now') - 2440587.5) * 86400.0)
+        ON CONFLICT (username) DO UPDATE SET version = version + 1, modified = excluded.modified;
+END;
+CREATE TRIGGER IF NOT EXISTS users_version_insert AFTER INSERT ON users BEGIN
+    INSERT INTO user_versions VALUES (new.username, 1, (julianday('now') - 2440587.5) * 86400.0)
+        ON CONFLICT (username) DO UPDATE SET version = version + 1, modified = excluded.modified;
+END;
+CREATE TRIGGER IF NOT EXISTS users_version_update AFTER UPDATE ON users BEGIN
+    INSERT INTO user_versions VALUES (new.username, 1, (julianday('now') - 2440587.5) * 86400.0)
+        ON CONFLICT (username) DO UPDATE SET version = version + 1, modified = excluded.modified;
+END;
+
+-- note history; each row is one revision record (keyframe or delta) as JSON
+CREATE TABLE IF NOT EXISTS note_revisions (
+    note_id INTEGER NOT NULL,
+    rev INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (note_id, rev)
+) WITHOUT ROWID;
+
+-- full-text index kept in step with notes by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    title, content, content='notes', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    INSERT INTO notes_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
+"""
+
+# utils.pagination's sort keys as SQL; a missing date sorts as datetime.min
+PAGE_SORT_KEYS = {
+    "created": "coalesce(created_at, '0001-01-01T00:00:00')",
+    "updated": "coalesce(updated_at, created_at, '0001-01-01T00:00:00')",
+    "title": "casefold(title)",
+}
+# what a note card needs: it shows 120 characters of content and "..." past that
+CARD_COLUMNS = "id, owner, title, substr(content, 1, 121) AS content, status, created_at, updated_at"
+
+SEARCH_NOTES = """
+SELECT notes.* FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid
+WHERE notes_fts MATCH ? AND notes.owner = ? {status_filter}
+ORDER BY bm25(notes_fts, 2.0, 1.0)
+    / (1 + (julianday('now') - julianday(coalesce(notes.updated_at, notes.created_at, '2000-01-01'))) / 30.0)
+LIMIT ?
+"""
+
+
+class SqliteBackend:
+    """Storage backed by a single SQLite database in WAL mode.
+
+    Each thread gets its own connection (sqlite3 connections can't be shared
+    across threads), created lazily and reused for the life of the thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._tx() as conn:
+            had_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'").fetchone()
+            version_columns = [r["name"] for r in conn.execute("PRAGMA table_info(user_versions)")]
+            if version_columns and "modified" not in version_columns:
+                # older databases: add the column; SCHEMA recreates the triggers to fill it
+                conn.execute("ALTER TABLE user_versions ADD COLUMN modified REAL NOT NULL DEFAULT 0")
+                for name in ("notes_version_insert", "notes_version_update", "notes_version_delete",
+                             "users_version_update"):
+                    conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            conn.executescript(SCHEMA)
+            if not had_fts:
+                conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect_wal(self.path)
+            conn.row_factory = sqlite3.Row
+            # the title sort key, casefolded exactly as the JSON backend does it
+            conn.create_function("casefold", 1, str.casefold, deterministic=True)
+            # INSERT OR REPLACE must fire the delete trigger that keeps notes_fts in step
+            conn.execute("PRAGMA recursive_triggers=ON")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def _tx(self):
+        """One transaction per call, or one for the whole enclosing batch()."""
+        conn = self._conn()
+        if self._local.depth:
+            yield conn
+            return
+        self._local.depth += 1
+        try:
+            with conn:
+                # take the write lock up front so read-modify-write is serialized
+                conn.execute("BEGIN IMMEDIATE")
+                yield conn
+        finally:
+            self._local.depth -= 1
+
+    def batch(self):
+        return self._tx()
+
+    @staticmethod
+    def _user_row(row):
+        return json.loads(row["data"]) if row else None
+
+    @staticmethod
+    def _note_row(row):
+        return dict(row) if row else None
+
+    # users
+    def find_user_by_username(self, username):
+        row = self._conn().execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+        return self._user_row(row)
+
+    def find_user_by_email(self, email):
+        row = self._conn().execute(
+            "SELECT data FROM users WHERE lower(email) = lower(?) ORDER BY rowid LIMIT 1", (email,)
+        ).fetchone()
+        return self._user_row(row)
+
+    def all_users(self):
+        return [self._user_row(r) for r in self._conn().execute("SELECT data FROM users")]
+
+    def add_user(self, user):
+        try:
+            with self._tx() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, email, data) VALUES (?, ?, ?)",
+                    (user["username"], user.get("email", ""), json.dumps(user, default=str)),
+                )
+        except sqlite3.IntegrityError:
+            raise DuplicateUserError(f"Username {user['username']!r} already exists.") from None
+
+    def update_user(self, username, fields):
+        with self._tx() as conn:
+            row = conn.execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+            if row is None:
+                return False
+            user = self._user_row(row)
+            user.update(fields)
+            conn.execute(
+                "UPDATE users SET email = ?, data = ? WHERE username = ?",
+                (user.get("email", ""), json.dumps(user, default=str), username),
+            )
+            return True
+
+    # notes
+    def all_notes(self):
+        return [self._note_row(r) for r in self._conn().execute("SELECT * FROM notes ORDER BY id")]
+
+    def notes_by_owner(self, owner, status=None):
+        if status is None:
+            rows = self._conn().execute("SELECT * FROM notes WHERE owner = ? ORDER BY id", (owner,))
+        else:
+            rows = self._conn().execute(
+                "SELECT * FROM notes WHERE owner = ? AND status = ? ORDER BY id", (owner, status)
+            )
+        return [self._note_row(r) for r in rows]
+
+    def iter_notes_by_owner(self, owner, status=None, chunk_size=500):
+        """Keyset scan over id, one short query per chunk, so no read
+        transaction stays open while the caller streams the rows out."""
+        status_filter = "" if status is None else "AND status = ?"
+        params = (owner,) if status is None else (owner, status)
+        last_id = 0
+        while True:
+            rows = self._conn().execute(
+                f"SELECT * FROM notes WHERE owner = ? {status_filter} AND id > ? ORDER BY id LIMIT ?",
+                (*params, last_id, chunk_size),
+            ).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield self._note_row(r)
+            last_id = rows[-1]["id"]
+
+    def notes_page(self, owner, status, sort_by, cursor, limit):
+        """Keyset page in SQL: only ``limit + 1`` rows of card columns are
+        read, through the idx_notes_page_* indexes for the date sorts.
+        ``content`` is cut to the card preview."""
+        key_name, descending = sort_mode(sort_by)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        expr = PAGE_SORT_KEYS[key_name]
+        op, order = ("<", "DESC") if descending else (">", "ASC")
+        sql = f"SELECT {CARD_COLUMNS}, {expr} AS sort_key FROM notes WHERE owner = :owner AND status = :status"
+        params = {"owner": owner, "status": status, "limit": limit + 1}
+        after = decode_cursor(cursor, key_name)
+        if after is not None:
+            value, params["id"] = after
+            params["value"] = value.isoformat() if isinstance(value, datetime) else value
+            # (key, id) past the cursor, spelled so the key part is an index range
+            sql += f" AND {expr} {op}= :value AND ({expr} {op} :value OR id {op} :id)"
+        sql += f" ORDER BY {expr} {order}, id {order} LIMIT :limit"
+        rows = self._conn().execute(sql, params).fetchall()
+        page = rows[:limit]
+        next_cursor = encode_cursor((page[-1]["sort_key"], page[-1]["id"])) if len(rows) > limit else None
+        return [{k: row[k] for k in NOTE_COLUMNS} for row in page], next_cursor
+
+    def search_notes(self, owner, query, status, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " ".join(f'"{t}"*' for t in terms)
+        params = [match, owner]
+        status_filter = ""
+        if status is not None:
+            status_filter = "AND notes.status = ?"
+            params.append(status)
+        rows = self._conn().execute(SEARCH_NOTES.format(status_filter=status_filter), (*params, limit))
+        return [self._note_row(r) for r in rows]
+
+    @staticmethod
+    def _note_values(note):
+        return tuple((note.get(c) or "") if c == "content" else note.get(c) for c in NOTE_COLUMNS)
+
+    def _insert_notes(self, conn, notes):
+        if len(notes) == 1:
+            return conn.execute(INSERT_NOTE, self._note_values(notes[0]))
+        return conn.executemany(INSERT_NOTE, [self._note_values(n) for n in notes])
+
+    def replace_notes(self, notes):
+        with self._tx() as conn:
+            conn.execute("DELETE FROM notes")
+            self._insert_notes(conn, notes)
+
+    def next_note_id(self):
+        return self._conn().execute("SELECT COALESCE(MAX(id), 0) + 1 FROM notes").fetchone()[0]
+
+    def add_note(self, note):
+        with self._tx() as conn:
+            # a NULL id makes SQLite allocate the next rowid atomically
+            cur = self._insert_notes(conn, [note])
+            return note["id"] if note.get("id") is not None else cur.lastrowid
+
+    def get_note(self, note_id):
+        row = self._conn().execute("SELECT * FROM notes WHERE id = ?", (note_id,)).fetchone()
+        return self._note_row(row)
+
+    def update_note(self, note_id, fields):
+        fields = {k: v for k, v in fields.items() if k in NOTE_COLUMNS and k != "id"}
+        if not fields:
+            return self.get_note(note_id) is not None
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._tx() as conn:
+            cur = conn.execute(f"UPDATE notes SET {assignments} WHERE id = ?", (*fields.values(), note_id))
+            return cur.rowcount > 0
+
+    def delete_note(self, note_id):
+        with self._tx() as conn:
+            return conn.execute("DELETE FROM notes WHERE id = ?", (note_id,)).rowcount > 0
+
+    # revisions
+    def note_revisions(self, note_id):
+        rows = self._conn().execute(
+            "SELECT rev, data FROM note_revisions WHERE note_id = ? ORDER BY rev", (note_id,)
+        )
+        return [dict(json.loads(r["data"]), rev=r["rev"]) for r in rows]
+
+    def _insert_revisions(self, conn, note_id, records):
+        conn.executemany(
+            "INSERT INTO note_revisions (note_id, rev, data) VALUES (?, ?, ?)",
+            [(note_id, r["rev"], json.dumps({k: v for k, v in r.items() if k != "rev"}, separators=(",", ":")))
+             for r in records],
+        )
+
+    def append_revisions(self, note_id, records):
+        with self._tx() as conn:
+            rev = conn.execute(
+                "SELECT COALESCE(MAX(rev), 0) FROM note_revisions WHERE note_id = ?", (note_id,)
+            ).fetchone()[0]
+            numbered = [dict(r, rev=rev + i) for i, r in enumerate(records, 1)]
+            self._insert_revisions(conn, note_id, numbered)
+            return [r["rev"] for r in numbered]
+
+    def replace_revisions(self, note_id, records):
+        with self._tx() as conn:
+            conn.execute("DELETE FROM note_revisions WHERE note_id = ?", (note_id,))
+            self._insert_revisions(conn, note_id, records)
+
+    def delete_revisions(self, note_id):
+        with self._tx() as conn:
+            conn.execute("DELETE FROM note_revisions WHERE note_id = ?", (note_id,))
+
+    def revision_note_ids(self):
+        return [r[0] for r in self._conn().execute("SELECT DISTINCT note_id FROM note_revisions")]
+
+    def data_version(self, username):
+        row = self._conn().execute(
+            "SELECT version, modified FROM user_versions WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            return "0", 0
+        return f"{row['version']}.{row['modified']!r}", row["modified"]
+
+    def compact(self):
+        self._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def preload(self):
+        pass  # nothing is held in memory; SQLite's page cache warms up by itself
+
+    def save_index_cache(self):
+        pass
+
+    # migration
+    def import_json(self, users, notes):
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (username, email, data) VALUES (?, ?, ?)",
+                [(u["username"], u.get("email", ""), json.dumps(u, default=str)) for u in users],
+            )
+            self._insert_notes(conn, notes)
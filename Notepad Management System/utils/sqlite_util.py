@@ -0,0 +1,41 @@
+import os
+import sqlite3
+
+
+def connect_wal(path, **kwargs):
+    """Open ``path`` the way every SQLite store here does: WAL journal,
+    synchronous=NORMAL and a 30 s busy timeout. Extra keyword arguments go
+    to sqlite3.connect()."""
+    conn = sqlite3.connect(path, timeout=30, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def thread_connection(local, path, **kwargs):
+    """``local.conn``, opened with connect_wal() on first use by this thread.
+
+    sqlite3 connections can't be shared across threads, so each thread
+    keeps its own for its lifetime.
+    """
+    conn = getattr(local, "conn", None)
+    if conn is None:
+        conn = local.conn = connect_wal(path, **kwargs)
+    return conn
+
+
+def make_store(config, prefix, memory, sqlite, default_path):
+    """The store picked by ``<prefix>_BACKEND``.
+
+    "memory" returns ``memory()`` (per process); "sqlite", the default,
+    returns ``sqlite(path)`` with path from ``<prefix>_SQLITE_PATH`` or
+    ``default_path``, shared by every worker.
+    """
+    backend = config.get(f"{prefix}_BACKEND", "sqlite")
+    if backend == "memory":
+        return memory()
+    if backend == "sqlite":
+        path = config.get(f"{prefix}_SQLITE_PATH") or default_path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return sqlite(path)
+    raise ValueError(f"Unknown {prefix}_BACKEND: {backend}")
@@ -1,103 +1,227 @@
-import json
+import atexit
 import os
+import time
+from contextlib import contextmanager
 from typing import Any
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-
-BASE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+from utils import codec, hashing, metrics
+from utils.json_backend import JsonBackend
+from utils.note_shards import MANIFEST_NAME, ShardedNoteStore, split_notes_file
+from utils.sqlite_backend import SqliteBackend
+from utils.user_store import DuplicateUserError
+from utils.locking import atomic_write
+from utils.pagination import PAGE_SIZE
+
+BASE_DIR = os.environ.get("NOTEPAD_DATA_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 USERS_FILE = os.path.join(BASE_DIR, "users.json")
 NOTES_FILE = os.path.join(BASE_DIR, "notes.json")
+NOTES_DIR = os.path.join(BASE_DIR, "notes")
+SQLITE_FILE = os.path.join(BASE_DIR, "notepad.db")
+
+# How data files are encoded on write (STORAGE_FORMAT); reads accept any format
+_codec = codec.Codec()
+# set once ensure_data_files() has run, so reads and writes skip the stat calls
+_data_files_ready = False
 
 def ensure_data_files():
+    global _data_files_ready
     os.makedirs(BASE_DIR, exist_ok=True)
     if not os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "w") as f:
-            json.dump({"users": []}, f, indent=2)
+        with open(USERS_FILE, "wb") as f:
+            f.write(_codec.encode({"users": []}))
     if not os.path.exists(NOTES_FILE):
-        with open(NOTES_FILE, "w") as f:
-            json.dump({"notes": []}, f, indent=2)
+        with open(NOTES_FILE, "wb") as f:
+            f.write(_codec.encode({"notes": []}))
+    _data_files_ready = True
 
 def read_json(path: str) -> Any:
-    ensure_data_files()
-    with open(path, "r") as f:
-        return json.load(f)
+    if not _data_files_ready:
+        ensure_data_files()
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = _codec.decode(raw)
+    metrics.record_io("read_json", time.perf_counter() - started, len(raw))
+    return data
 
 def write_json(path: str, data: Any):
+    if not _data_files_ready:
+        ensure_data_files()
+    started = time.perf_counter()
+    raw = _codec.encode(data)
+    atomic_write(path, lambda f: f.write(raw), binary=True)
+    metrics.record_io("write_json", time.perf_counter() - started, len(raw))
+
+# Active backend; create_app() swaps it via configure()
+_backend = JsonBackend(USERS_FILE, NOTES_FILE, load=read_json, dump=write_json)
+
+def configure(config):
+    global _backend, _codec
+    _codec = codec.Codec(config.get("STORAGE_FORMAT", codec.DEFAULT_FORMAT), config.get("STORAGE_FORMAT_LEVEL"))
+    backend = config.get("STORAGE_BACKEND", "json")
     ensure_data_files()
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2, default=str)
+    if backend == "json":
+        _backend = JsonBackend(USERS_FILE, NOTES_FILE, load=read_json, dump=write_json,
+                               mode=config.get("STORAGE_MODE", "snapshot"),
+                               compact_threshold=int(config.get("JOURNAL_COMPACT_THRESHOLD", 500)),
+                               layout=config.get("STORAGE_LAYOUT", "single"))
+    elif backend == "sqlite":
+        _backend = SqliteBackend(config.get("SQLITE_PATH") or SQLITE_FILE)
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    if config.get("METRICS_ENABLED"):
+        _backend = metrics.CountingBackend(_backend)
+
+def compact_storage():
+    _backend.compact()
+
+def preload():
+    """Load the data (or its index cache) now, so the first request doesn't."""
+    _backend.preload()
+
+@atexit.register
+def save_index_cache():
+    """Write the active backend's index cache if it's behind; also runs at exit."""
+    _backend.save_index_cache()
+
+def shard_notes():
+    """Split data/notes.json into per-owner files under data/notes/.
+
+    Returns the number of notes moved (0 if already sharded).
+    """
+    store = ShardedNoteStore(NOTES_DIR, load=read_json, dump=write_json)
+    return split_notes_file(NOTES_FILE, store)
+
+def import_json_to_sqlite(db_path: str = None):
+    """One-shot copy of data/users.json and the notes (data/notes/ shards if
+    present, else data/notes.json) into SQLite."""
+    target = SqliteBackend(db_path or SQLITE_FILE)
+    users = read_json(USERS_FILE)["users"]
+    if os.path.exists(os.path.join(NOTES_DIR, MANIFEST_NAME)):
+        notes = ShardedNoteStore(NOTES_DIR, load=read_json, dump=write_json).all()
+    else:
+        notes = read_json(NOTES_FILE)["notes"]
+    target.import_json(users, notes)
+    return len(users), len(notes)
 
 # User helpers
 def find_user_by_username(username: str):
-    users = read_json(USERS_FILE)["users"]
-    for u in users:
-        if u.get("username") == username:
-            return u
-    return None
+    return _backend.find_user_by_username(username)
 
 def find_user_by_email(email: str):
-    users = read_json(USERS_FILE)["users"]
-    for u in users:
-        if u.get("email", "").lower() == email.lower():
-            return u
-    return None
+    return _backend.find_user_by_email(email)
+
+def find_user(identifier: str):
+    """Login lookup: username first, then email. Both are hash lookups."""
+    return _backend.find_user_by_username(identifier) or _backend.find_user_by_email(identifier)
+
+def get_all_users():
+    return _backend.all_users()
 
 def add_user(user_dict: dict):
-    data = read_json(USERS_FILE)
-    data["users"].append(user_dict)
-    write_json(USERS_FILE, data)
+    """Raises DuplicateUserError if the username is taken."""
+    _backend.add_user(user_dict)
 
 def update_user(username: str, update_fields: dict):
-    data = read_json(USERS_FILE)
-    for i, u in enumerate(data["users"]):
-        if u["username"] == username:
-            data["users"][i].update(update_fields)
-            write_json(USERS_FILE, data)
-            return True
-    return False
-
-# Password helpers
+    return _backend.update_user(username, update_fields)
+
+def data_version(username: str):
+    """``(token, last_modified)`` that changes whenever the user's notes or
+    profile do; cheap enough to check before reading anything else. It is
+    derived from what's on disk, so every worker computes the same one."""
+    return _backend.data_version(username)
+
+# Password helpers (KDF work runs in utils.hashing's bounded process pool;
+# both raise HashPoolBusy when the queue is full)
 def hash_password(plain: str) -> str:
-    return generate_password_hash(plain)
+    return hashing.hash_pool.hash(plain)
 
 def verify_password(hashed: str, plain: str) -> bool:
-    return check_password_hash(hashed, plain)
+    return hashing.hash_pool.verify(hashed, plain)
+
+def upgrade_password_hash(username: str, hashed: str, plain: str):
+    """After a successful login, re-hash in the background if the stored hash
+    uses an older method/cost than PASSWORD_HASH_METHOD."""
+    if hashing.hash_pool.needs_rehash(hashed):
+        hashing.hash_pool.rehash_in_background(
+            plain, lambda new_hash: update_user(username, {"password_hash": new_hash})
+        )
 
 # Notes helpers
 def get_all_notes():
-    return read_json(NOTES_FILE)["notes"]
+    return _backend.all_notes()
+
+def get_notes_by_owner(owner: str, status: str = None):
+    return _backend.notes_by_owner(owner, status)
+
+def iter_notes_by_owner(owner: str, status: str = None):
+    """Lazily yield an owner's notes in id order (for streaming exports)."""
+    return _backend.iter_notes_by_owner(owner, status)
+
+def get_notes_page(owner: str, status: str, sort_by: str, cursor: str = None, limit: int = PAGE_SIZE):
+    """Return ``(notes, next_cursor)`` for one page of an owner's notes."""
+    return _backend.notes_page(owner, status, sort_by, cursor, limit)
+
+def search_notes(owner: str, query: str, status: str = None, limit: int = 50):
+    """Full-text search over one owner's notes, best match first."""
+    return _backend.search_notes(owner, query, status, limit)
 
 def save_all_notes(notes_list):
-    write_json(NOTES_FILE, {"notes": notes_list})
+    _backend.replace_notes(notes_list)
 
 def new_note_id():
-    notes = get_all_notes()
-    if not notes:
-        return 1
-    return max(n["id"] for n in notes) + 1
+    return _backend.next_note_id()
 
 def add_note(note):
-    notes = get_all_notes()
-    notes.append(note)
-    save_all_notes(notes)
+    """Store ``note``; if it has no id one is allocated atomically and returned."""
+    return _backend.add_note(note)
+
+@contextmanager
+def batch_writes():
+    """Group note mutations into one locked read-modify-write."""
+    with _backend.batch():
+        yield
 
 def find_note_by_id(note_id):
-    notes = get_all_notes()
-    for n in notes:
-        if n["id"] == note_id:
-            return n
-    return None
+    return _backend.get_note(note_id)
+
+def find_notes_by_ids(note_ids):
+    """The notes among ``note_ids`` that exist; unknown ids are skipped."""
+    return [n for n in map(_backend.get_note, note_ids) if n is not None]
 
 def update_note(note_id, fields):
-    notes = get_all_notes()
-    for i, n in enumerate(notes):
-        if n["id"] == note_id:
-            notes[i].update(fields)
-            save_all_notes(notes)
-            return True
-    return False
+    return _backend.update_note(note_id, fields)
 
 def delete_note_permanent(note_id):
-    notes = get_all_notes()
-    notes = [n for n in notes if n["id"] != note_id]
-    save_all_notes(notes)
+    _backend.delete_note(note_id)
+    _backend.delete_revisions(note_id)
+
+def update_notes(note_ids, fields):
+    """Apply ``fields`` to every note in ``note_ids`` with a single storage write."""
+    with batch_writes():
+        for note_id in note_ids:
+            update_note(note_id, fields)
+
+def delete_notes_permanent(note_ids):
+    """Delete every note in ``note_ids`` (and its history) with a single storage write."""
+    with batch_writes():
+        for note_id in note_ids:
+            delete_note_permanent(note_id)
+
+# Revision history (records are built by utils.revisions)
+def get_note_revisions(note_id):
+    """Every stored revision record of a note, oldest first."""
+    return _backend.note_revisions(note_id)
+
+def append_note_revisions(note_id, records):
+    """Append records after the note's latest revision; returns their numbers."""
+    return _backend.append_revisions(note_id, records)
+
+def replace_note_revisions(note_id, records):
+    _backend.replace_revisions(note_id, records)
+
+def delete_note_revisions(note_id):
+    _backend.delete_revisions(note_id)
+
+def note_ids_with_revisions():
+    return _backend.revision_note_ids()
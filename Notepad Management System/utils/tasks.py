@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from utils import avatars, revisions, storage
+from utils.jobs import task
+
+PURGE_ARCHIVED_DAYS = 0  # 0 = archived notes are kept until deleted by hand
+PURGE_INTERVAL = 24 * 3600
+AVATAR_GC_INTERVAL = 24 * 3600
+COMPACT_INTERVAL = 3600
+
+
+# Handlers for the jobs the app defers to utils.jobs; importing this module registers them.
+@task("avatar_thumbnails")
+def avatar_thumbnails(name):
+    avatars.avatar_store.make_thumbnails(name)
+
+
+@task("purge_archived")
+def purge_archived(days):
+    """Permanently delete notes archived at least ``days`` ago.
+
+    Archiving stamps updated_at, so it's taken as the archive date.
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    purged = 0
+    for user in storage.get_all_users():
+        stale = [n["id"] for n in storage.iter_notes_by_owner(user["username"], "archived")
+                 if (n.get("updated_at") or n.get("created_at") or "") < cutoff]
+        if stale:
+            storage.delete_notes_permanent(stale)
+            purged += len(stale)
+    return purged
+
+
+@task("prune_revisions")
+def prune_revisions(retention_days, max_revisions):
+    return revisions.prune_all(retention_days, max_revisions)
+
+
+@task("gc_avatars")
+def gc_avatars():
+    return avatars.avatar_store.collect_garbage(u.get("profile_pic") for u in storage.get_all_users())
+
+
+@task("compact_storage")
+def compact_storage():
+    storage.compact_storage()
+
+
+def schedule(queue, config):
+    """Register the periodic jobs on ``queue``; an interval of 0 turns one off."""
+    days = int(config.get("PURGE_ARCHIVED_DAYS", PURGE_ARCHIVED_DAYS))
+    if days:
+        queue.every("purge_archived", int(config.get("PURGE_INTERVAL", PURGE_INTERVAL)), {"days": days})
+    queue.every("prune_revisions", int(config.get("REVISION_PRUNE_INTERVAL", revisions.PRUNE_INTERVAL)), {
+        "retention_days": int(config.get("REVISION_RETENTION_DAYS", revisions.RETENTION_DAYS)),
+        "max_revisions": int(config.get("REVISION_MAX_COUNT", revisions.MAX_REVISIONS)),
+    })
+    queue.every("gc_avatars", int(config.get("AVATAR_GC_INTERVAL", AVATAR_GC_INTERVAL)))
+    queue.every("compact_storage", int(config.get("COMPACT_INTERVAL", COMPACT_INTERVAL)))
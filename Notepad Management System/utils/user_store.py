@@ -0,0 +1,52 @@
+from utils.record_store import RecordStore
+
+
+class DuplicateUserError(ValueError):
+    """Raised by add_user() when the username is already taken."""
+
+
+def email_key(email):
+    return (email or "").casefold()
+
+
+class UserStore(RecordStore):
+    """Resident users.json keyed by username, with a casefolded-email index.
+
+    Several accounts may share an email; lookups return the first one in
+    file order, as the old linear scan did.
+    """
+
+    collection = "users"
+    key = "username"
+
+    def _reset_indexes(self):
+        self._by_email = {}
+        self._order = {}
+
+    def _index(self, user):
+        # remember first-seen order so an update doesn't change which account wins
+        self._order.setdefault(user["username"], len(self._order))
+        self._by_email.setdefault(email_key(user.get("email")), set()).add(user["username"])
+
+    def _unindex(self, user):
+        key = email_key(user.get("email"))
+        usernames = self._by_email.get(key, set())
+        usernames.discard(user["username"])
+        if not usernames:
+            self._by_email.pop(key, None)
+
+    def find_by_email(self, email):
+        with self._lock:
+            self.refresh()
+            usernames = self._by_email.get(email_key(email))
+            if not usernames:
+                return None
+            return dict(self._records[min(usernames, key=self._order.__getitem__)])
+
+    def insert_unique(self, user):
+        with self._write_lock:
+            with self._lock:
+                self.refresh()
+                if user["username"] in self._records:
+                    raise DuplicateUserError(f"Username {user['username']!r} already exists.")
+            self.insert(user)
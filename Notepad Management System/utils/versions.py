@@ -0,0 +1,43 @@
+import os
+import time
+
+from utils.record_store import RecordStore
+
+
+class VersionStore(RecordStore):
+    """Per-user change counters for conditional GETs and cached fragments.
+
+    data/versions.json holds ``{"username", "version", "modified"}`` per
+    user, the JSON backend's counterpart of SQLite's user_versions table.
+    The backend bumps a user's entry after every write to their notes or
+    profile, so a change moves only that user's token, and since the file
+    is shared every worker (and a restarted one) computes the same token.
+    A missing file reads as empty; the first bump creates it.
+    """
+
+    collection = "versions"
+    key = "username"
+
+    def __init__(self, path, load, dump, **kwargs):
+        def load_or_empty(p):
+            return load(p) if os.path.exists(p) else {self.collection: []}
+
+        super().__init__(path, load=load_or_empty, dump=dump, **kwargs)
+
+    def bump(self, usernames):
+        usernames = {u for u in usernames if u}
+        if not usernames:
+            return
+        now = time.time()
+        with self.batch():
+            for username in usernames:
+                entry = self.get(username)
+                self.insert({"username": username, "version": (entry["version"] if entry else 0) + 1,
+                             "modified": now})
+
+    def token(self, username):
+        """``(token, last_modified)`` for ``username``, or None if never bumped."""
+        entry = self.get(username)
+        if entry is None:
+            return None
+        return f"{entry['version']}.{entry['modified']!r}", entry["modified"]
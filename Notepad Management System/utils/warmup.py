@@ -0,0 +1,60 @@
+import gc
+import os
+import time
+
+from flask import g
+from jinja2 import FileSystemBytecodeCache
+
+from utils import storage
+
+# this process's startup costs, in seconds (None until measured)
+boot_stats = {"boot_seconds": None, "first_request_seconds": None, "templates": 0}
+
+
+def precompile_templates(app):
+    """Load every template now; with a warm bytecode cache nothing is parsed."""
+    env = app.jinja_env
+    names = env.list_templates(filter_func=lambda name: name.endswith(".html"))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def init_app(app, started):
+    """Warm this worker before it takes traffic and record how long that took.
+
+    Compiled templates go to a FileSystemBytecodeCache in TEMPLATE_CACHE_DIR
+    that every worker shares; entries are keyed by the template source, so
+    an edited template is simply recompiled. With WARM_START, templates are
+    loaded and the data (or its index cache) is read here rather than in
+    the first request. ``started`` is the perf_counter() at the top of
+    create_app(). Boot and first-request times are logged and exported as
+    gauges when metrics are on.
+    """
+    cache_dir = app.config.get("TEMPLATE_CACHE_DIR")
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    if app.config.get("WARM_START"):
+        boot_stats["templates"] = precompile_templates(app)
+        storage.preload()
+        # what's loaded now lives as long as the worker: keep the collector
+        # from rescanning it (and, after a fork, from touching its pages)
+        gc.freeze()
+    boot_stats["boot_seconds"] = time.perf_counter() - started
+    app.logger.info("worker %d ready in %.0f ms (%d templates warmed)",
+                    os.getpid(), boot_stats["boot_seconds"] * 1000, boot_stats["templates"])
+
+    @app.before_request
+    def first_request_started():
+        if boot_stats["first_request_seconds"] is None:
+            g.warmup_started = time.perf_counter()
+
+    @app.after_request
+    def first_request_finished(response):
+        first_started = g.pop("warmup_started", None)
+        if first_started is not None and boot_stats["first_request_seconds"] is None:
+            boot_stats["first_request_seconds"] = time.perf_counter() - first_started
+            app.logger.info("worker %d served its first request in %.1f ms",
+                            os.getpid(), boot_stats["first_request_seconds"] * 1000)
+        return response